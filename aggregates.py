@@ -0,0 +1,54 @@
+"""Precomputed price aggregates for the dashboard, sidebar and predictor.
+
+Everything here depends only on the dataset, so it is computed once per
+dataset version and afterwards every metric is a dictionary/index lookup.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+GROUP_COLUMNS = ("primary_ingredient", "manufacturer", "dosage_form")
+TOP_MANUFACTURERS = 10
+
+
+@dataclass(frozen=True)
+class Aggregates:
+    n_products: int
+    n_manufacturers: int
+    n_ingredients: int
+    mean_price: float
+    min_price: float
+    max_price: float
+    # price_inr mean/count/min/max per value of each GROUP_COLUMNS entry
+    by_group: dict
+    top_manufacturers: pd.Series
+
+    def group_stats(self, column):
+        return self.by_group[column]
+
+    def mean_price_for(self, column, value):
+        """Average price of products with `column == value` (NaN if unseen)."""
+        table = self.by_group[column]
+        try:
+            return float(table.at[value, 'mean'])
+        except KeyError:
+            return np.nan
+
+
+def compute_aggregates(df):
+    price = df['price_inr']
+    by_group = {
+        col: df.groupby(col, observed=True)['price_inr'].agg(['mean', 'count', 'min', 'max'])
+        for col in GROUP_COLUMNS
+    }
+    return Aggregates(
+        n_products=len(df),
+        n_manufacturers=int(df['manufacturer'].nunique()),
+        n_ingredients=int(df['primary_ingredient'].nunique()),
+        mean_price=float(price.mean()),
+        min_price=float(price.min()),
+        max_price=float(price.max()),
+        by_group=by_group,
+        top_manufacturers=df['manufacturer'].value_counts().head(TOP_MANUFACTURERS),
+    )
@@ -1,14 +1,31 @@
+import startup  # first, so the startup clock covers every import below
+
+import os
+
 import streamlit as st
 import pandas as pd
-import numpy as np
-import joblib
-import re
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.compose import ColumnTransformer
+from features import build_features, feature_row, model_strength_parser
+from batch_predict import DEFAULT_CHUNK_SIZE, MODEL_PATH, iter_csv_bytes, predict_batch, predict_prices, read_table
+from search_index import SEARCH_MODES, SearchIndex
+from what_if import DEFAULT_POINTS, MAX_HEATMAP_POINTS, SWEEP_FEATURES, default_ranges, price_grid, sweep_values
+from explorer import PAGE_SIZES, SORT_OPTIONS, ResultBrowser, page_count
+from aggregates import compute_aggregates
+from data_store import DATA_PATH, SharedDataset, dataset_version, process_memory
+from form_options import MAX_OPTIONS, TYPEAHEAD_MIN_VALUES, build_option_indexes
+from model_artifact import artifact_path_for, is_fresh, load_artifact
+from model_watcher import DEFAULT_INTERVAL as DEFAULT_RELOAD_INTERVAL, ModelWatcher, model_fingerprint
+from prediction_cache import PredictionCache, row_key
+from dashboard import build_dashboard
+from comparables import DEFAULT_K as COMPARABLE_K, ComparableIndex
+from explain import DEFAULT_CACHE_SIZE as EXPLANATION_CACHE_SIZE, contributions_many, price_effects
+import metrics
+
+startup.mark('imports')
+
+# sessions share one dataset; a write to a view copies that column instead of changing it for everyone
+pd.set_option("mode.copy_on_write", True)
 
 # --- Setup halaman ---
 st.set_page_config(
@@ -177,22 +194,139 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Fungsi Load ---
-@st.cache_data
-def load_data():
-    return pd.read_csv("pharma_data_cleaned.csv")
+# `version` is only part of the cache key: a changed CSV gets a new entry.
+# cache_resource, not cache_data: one read-only frame per process, not a copy per session
+@st.cache_resource
+def load_dataset_handle(version=None):
+    with metrics.timer('load_data'):
+        dataset = SharedDataset(DATA_PATH)
+    metrics.gauge('pharma_dataset_bytes', lambda: dataset.nbytes, "Memory held by the shared dataset")
+    metrics.gauge('pharma_process_memory_bytes', lambda: {(('kind', kind),): value
+                                                          for kind, value in process_memory().items()},
+                  "Resident memory of the app process")
+    return dataset
+
+def load_data(version=None):
+    return load_dataset_handle(version).view()
 
+# bytes this session's frames hold beyond the shared dataset, shown in the sidebar
+def track_session_memory(name, frame):
+    st.session_state.setdefault('memory', {})[name] = load_dataset_handle(data_version).private_nbytes(frame)
+
+# Loads the model (and its compiled evaluator, verified on real rows) and swaps
+# in a retrained one every PHARMA_MODEL_RELOAD_INTERVAL seconds (0 never reloads)
 @st.cache_resource
+def load_model_watcher():
+    caches = (load_prediction_cache(), load_explanation_cache())
+    probe = build_features(load_data(dataset_version(DATA_PATH)).head(200))
+    interval = float(os.environ.get("PHARMA_MODEL_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL))
+
+    def on_swap(loaded):
+        for cache in caches:
+            cache.invalidate()
+
+    with metrics.timer('load_model'):
+        watcher = ModelWatcher(MODEL_PATH, interval, probe=probe, on_swap=on_swap)
+    return watcher.start()
+
 def load_model():
-    return joblib.load("xgb_price_predictor.joblib")
+    return load_model_watcher().current.model
 
-df = load_data()
-model = load_model()
+# the form's strength text, parsed the way the serving model's training data was
+def form_features(row):
+    return feature_row(row, model_strength_parser(load_model()))
 
-# --- Helper Ekstraksi Strength ---
-def extract_strength(text):
-    if pd.isnull(text): return np.nan
-    match = re.search(r"(\d+\.?\d*)", str(text))
-    return float(match.group(1)) if match else np.nan
+# shared by every session in this process
+@st.cache_resource
+def load_prediction_cache():
+    cache = PredictionCache(model_path=MODEL_PATH)
+    metrics.register_cache(cache)
+    return cache
+
+# per-feature contributions, under the same keys as the predictions
+@st.cache_resource
+def load_explanation_cache():
+    cache = PredictionCache(EXPLANATION_CACHE_SIZE, model_path=MODEL_PATH)
+    metrics.register_cache(cache, name="explanations")
+    return cache
+
+# Prometheus endpoint on a side port, since Streamlit can't serve custom routes
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get("PHARMA_METRICS_PORT")
+    return metrics.start_http_server(int(port)) if port else None
+
+# None (use model.predict) if the model can't be compiled or disagrees with it
+def load_compiled_predictor():
+    return load_model_watcher().current.compiled
+
+@st.cache_resource
+def load_search_index(version=None):
+    with metrics.timer('search_index_build'):
+        return SearchIndex(load_data(version))
+
+@st.cache_resource
+def load_result_browser(version=None):
+    return ResultBrowser(load_data(version))
+
+@st.cache_resource
+def load_sweep_ranges(version=None):
+    return default_ranges(load_data(version))
+
+# keyed on both versions: options follow the dataset's counts and the model's encoder.
+# A fresh artifact's categories are read without its booster; otherwise they come
+# from the watcher's model, so the first render never loads a second copy of it.
+@st.cache_resource
+def load_form_options(data_version=None, model_version=None):
+    artifact_path = artifact_path_for(MODEL_PATH)
+    model = load_artifact(artifact_path) if is_fresh(artifact_path, MODEL_PATH) else load_model()
+    with metrics.timer('form_options'):
+        return build_option_indexes(load_data(data_version), model)
+
+@st.cache_resource
+def load_comparable_index(version=None):
+    with metrics.timer('comparables_index_build'):
+        return ComparableIndex(load_data(version))
+
+@st.cache_resource
+def load_aggregates(version=None):
+    with metrics.timer('aggregates'):
+        return compute_aggregates(load_data(version))
+
+# plotly is imported inside, so the header and sidebar render while it loads
+@st.cache_resource
+def load_dashboard(version=None):
+    with metrics.timer('dashboard_build'):
+        dashboard = build_dashboard(load_aggregates(version), load_data(version))
+    metrics.gauge('pharma_dashboard_spec_bytes', lambda: {(('chart', name),): size
+                                                          for name, size in dashboard.spec_bytes.items()},
+                  "Serialized size of the cached dashboard figures")
+    return dashboard
+
+# Loads what the first render doesn't need in the background; /ready on the
+# metrics port answers 503 until it's done (PHARMA_WARMUP=0 skips it). Streamlit
+# logs a harmless "missing ScriptRunContext" for cached calls from that thread.
+@st.cache_resource
+def start_warmup(version=None):
+    if os.environ.get("PHARMA_WARMUP", "1").lower() in ("0", "false", "no"):
+        startup.set_ready()
+        return None
+    return startup.warm_up([
+        ('model', load_model_watcher),
+        ('search_index', lambda: load_search_index(version)),
+        ('comparables', lambda: load_comparable_index(version)),
+    ])
+
+metrics.start_trace()
+start_metrics_server()
+data_version = dataset_version(DATA_PATH)
+df = load_data(data_version)
+st.session_state['memory'] = {}
+prediction_cache = load_prediction_cache()
+agg = load_aggregates(data_version)
+startup.mark('data')
+# the model, compiled predictor and search index are fetched where they're used
+start_warmup(data_version)
 
 # --- Sidebar ---
 with st.sidebar:
@@ -204,14 +338,17 @@ with st.sidebar:
     """, unsafe_allow_html=True)
     
     st.markdown("### 📊 Dataset Statistics")
-    st.metric("Total Products", f"{len(df):,}")
-    st.metric("Manufacturers", f"{df['manufacturer'].nunique()}")
-    st.metric("Primary Ingredient", f"{df['primary_ingredient'].nunique()}")
-    st.metric("Average Price", f"₹{df['price_inr'].mean():.2f}")
+    st.metric("Total Products", f"{agg.n_products:,}")
+    st.metric("Manufacturers", f"{agg.n_manufacturers}")
+    st.metric("Primary Ingredient", f"{agg.n_ingredients}")
+    st.metric("Average Price", f"₹{agg.mean_price:.2f}")
     
     st.markdown("### ⚠️ Disclaimer")
     st.info("The application is built for Machine Learning exploration and should not be used as a medical or commercial reference.")
 
+    # filled at the end of the script, once this run's frames are known
+    memory_panel = st.empty()
+
 # --- Header utama ---
 st.markdown("""
 <div class="welcome-banner">
@@ -239,7 +376,7 @@ with tab1:
             <h2>{:,}</h2>
             <p>Active in database</p>
         </div>
-        """.format(len(df)), unsafe_allow_html=True)
+        """.format(agg.n_products), unsafe_allow_html=True)
     
     with col2:
         st.markdown("""
@@ -248,7 +385,7 @@ with tab1:
             <h2>{}</h2>
             <p>Different companies</p>
         </div>
-        """.format(df['manufacturer'].nunique()), unsafe_allow_html=True)
+        """.format(agg.n_manufacturers), unsafe_allow_html=True)
     
     with col3:
         st.markdown("""
@@ -257,10 +394,10 @@ with tab1:
             <h2>{}</h2>
             <p>Unique compounds</p>
         </div>
-        """.format(df['primary_ingredient'].nunique()), unsafe_allow_html=True)
+        """.format(agg.n_ingredients), unsafe_allow_html=True)
     
     with col4:
-        avg_price = df['price_inr'].mean()
+        avg_price = agg.mean_price
         st.markdown("""
         <div class="metric-card">
             <h3>Avg Price</h3>
@@ -269,49 +406,24 @@ with tab1:
         </div>
         """.format(avg_price), unsafe_allow_html=True)
     
-    # Charts Row
+    # Charts Row: figures built once per dataset version, shared by all sessions
+    dashboard = load_dashboard(data_version)
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("### 📊 Price Distribution by Dosage Form")
-        dosage_stats = df.groupby('dosage_form')['price_inr'].agg(['mean', 'count']).reset_index()
-        dosage_stats = dosage_stats.sort_values('mean', ascending=False)
-        
-        fig_bar = px.bar(
-            dosage_stats, 
-            x='dosage_form', 
-            y='mean',
-            title='Average Price by Dosage Form',
-            color='mean',
-            color_continuous_scale='viridis'
-        )
-        fig_bar.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            xaxis_title="Dosage Form",
-            yaxis_title="Average Price (₹)"
-        )
-        st.plotly_chart(fig_bar, use_container_width=True)
+        with metrics.timer('chart', chart='dosage_form_bar'):
+            st.plotly_chart(dashboard.dosage_form_bar, use_container_width=True)
     
     with col2:
         st.markdown("### 🏭 Top Manufacturers by Product Count")
-        top_manufacturers = df['manufacturer'].value_counts().head(10)
-        
-        fig_pie = px.pie(
-            values=top_manufacturers.values,
-            names=top_manufacturers.index,
-            title='Market Share by Manufacturer'
-        )
-        fig_pie.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        with metrics.timer('chart', chart='manufacturer_pie'):
+            st.plotly_chart(dashboard.manufacturer_pie, use_container_width=True)
     
     # Data Table
     st.markdown("### Sample Data")
     st.dataframe(
-        df.head(10),
+        dashboard.sample,
         use_container_width=True,
         hide_index=True
     )
@@ -327,6 +439,25 @@ with tab2:
     </div>
     """, unsafe_allow_html=True)
     
+    # Options are the model's own categories. The long lists are narrowed here,
+    # outside the form, so only the matching values are sent to the browser.
+    options = load_form_options(data_version, model_fingerprint(MODEL_PATH))
+    
+    def choices(name, query=""):
+        index = options[name]
+        if len(index) < TYPEAHEAD_MIN_VALUES:
+            return index.all()
+        return index.suggest(query) or index.suggest()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        manufacturer_query = st.text_input("🔎 Find manufacturer", placeholder="Start of any word, e.g. cipla")
+    with col2:
+        ingredient_query = st.text_input("🔎 Find active ingredient", placeholder="Start of any word, e.g. para")
+    for name, query in (("manufacturer", manufacturer_query), ("primary_ingredient", ingredient_query)):
+        if query and not options[name].suggest(query, limit=1):
+            st.caption(f"No {name.replace('_', ' ')} starts with “{query}”; showing the most common ones.")
+    
     # Input Form
     with st.form("prediction_form"):
         col1, col2 = st.columns(2)
@@ -335,22 +466,22 @@ with tab2:
             st.markdown("####  Manufacturing Details")
             manufacturer = st.selectbox(
                 "Manufacturer",
-                sorted(df["manufacturer"].dropna().unique()),
-                help="Select the pharmaceutical company"
+                choices("manufacturer", manufacturer_query),
+                help=f"Up to {MAX_OPTIONS} matches, most common first; narrow them with the search above"
             )
             dosage_form = st.selectbox(
                 "Dosage Form",
-                sorted(df["dosage_form"].dropna().unique()),
+                choices("dosage_form"),
                 help="Select the form of medication (tablet, capsule, etc.)"
             )
             pack_unit = st.selectbox(
                 "Pack Unit",
-                sorted(df["pack_unit"].dropna().unique()),
+                choices("pack_unit"),
                 help="Select the packaging unit"
             )
             therapeutic_class = st.selectbox(
                 "Therapeutic Class",
-                sorted(df["therapeutic_class"].dropna().unique()),
+                choices("therapeutic_class"),
                 help="Select the therapeutic category"
             )
             is_discontinued = st.radio(
@@ -376,33 +507,46 @@ with tab2:
             )
             primary_ingredient = st.selectbox(
                 "Primary Active Ingredient",
-                sorted(df["primary_ingredient"].dropna().unique()),
-                help="Main active pharmaceutical ingredient"
+                choices("primary_ingredient", ingredient_query),
+                help=f"Up to {MAX_OPTIONS} matches, most common first; narrow them with the search above"
             )
             primary_strength = st.text_input(
                 "Primary Strength (mg)",
                 "500",
-                help="Strength of the primary ingredient in mg"
+                help="Strength of the primary ingredient: a number in mg, or with its unit (e.g. 1 g, 250 mcg, 250 mg/5 ml, 1%)"
             )
         
         submitted = st.form_submit_button("🎯 Predict Price", type="primary")
         
+        # the form's committed values, also the fixed features of the what-if sweep below;
+        # the strength is parsed (by form_features) only once a prediction needs the model
+        input_row = {
+            'manufacturer': manufacturer,
+            'dosage_form': dosage_form,
+            'pack_unit': pack_unit,
+            'primary_ingredient': primary_ingredient,
+            'therapeutic_class': therapeutic_class,
+            'pack_size': pack_size,
+            'num_active_ingredients': num_active_ingredients,
+            'is_discontinued': int(is_discontinued),
+            'primary_strength': primary_strength
+        }
+        
         if submitted:
-            input_df = pd.DataFrame([{
-                'manufacturer': manufacturer,
-                'dosage_form': dosage_form,
-                'pack_unit': pack_unit,
-                'primary_ingredient': primary_ingredient,
-                'therapeutic_class': therapeutic_class,
-                'pack_size': pack_size,
-                'num_active_ingredients': num_active_ingredients,
-                'is_discontinued': int(is_discontinued),
-                'primary_strength_mg': extract_strength(primary_strength)
-            }])
+            input_row = form_features(input_row)
+            input_df = pd.DataFrame([input_row])
             
+            def predict_single():
+                compiled_model = load_compiled_predictor()
+                if compiled_model is not None:
+                    with metrics.timer('predict', engine='compiled'):
+                        price = compiled_model.predict_price(input_df.iloc[0].to_dict())
+                    metrics.inc('pharma_predictions_total', engine='compiled')
+                    return price
+                return float(predict_prices(load_model(), input_df)[0])
+
             try:
-                pred_log = model.predict(input_df)
-                pred_price = np.expm1(pred_log[0])
+                pred_price = prediction_cache.get_or_compute(row_key(input_row), predict_single)
                 
                 st.markdown(f"""
                 <div class="prediction-result">
@@ -415,17 +559,19 @@ with tab2:
                 # Additional insights
                 col1, col2, col3 = st.columns(3)
                 
+                comparable, match_level = load_comparable_index(data_version).comparables(input_row, COMPARABLE_K)
+                
                 with col1:
-                    similar_products = df[df['primary_ingredient'] == primary_ingredient]
-                    avg_similar = similar_products['price_inr'].mean()
+                    avg_similar = comparable['price_inr'].median()
                     st.metric(
-                        "Similar Products Avg",
+                        "Comparable Products",
                         f"₹{avg_similar:.2f}",
-                        f"{((pred_price - avg_similar) / avg_similar * 100):+.1f}%"
+                        f"{((pred_price - avg_similar) / avg_similar * 100):+.1f}%",
+                        help=f"Median price of the {len(comparable)} closest products"
                     )
                 
                 with col2:
-                    manufacturer_avg = df[df['manufacturer'] == manufacturer]['price_inr'].mean()
+                    manufacturer_avg = agg.mean_price_for('manufacturer', manufacturer)
                     st.metric(
                         "Manufacturer Avg",
                         f"₹{manufacturer_avg:.2f}",
@@ -433,16 +579,188 @@ with tab2:
                     )
                 
                 with col3:
-                    market_avg = df['price_inr'].mean()
+                    market_avg = agg.mean_price
                     st.metric(
                         "Market Average",
                         f"₹{market_avg:.2f}",
                         f"{((pred_price - market_avg) / market_avg * 100):+.1f}%"
                     )
                 
+                # the nearest real products: same ingredient, then closest strength, pack and form
+                st.markdown("#### 🧭 Comparable products")
+                st.dataframe(
+                    comparable,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "brand_name": "Brand Name",
+                        "manufacturer": "Manufacturer",
+                        "dosage_form": "Dosage Form",
+                        "pack_size": st.column_config.NumberColumn("Pack Size", format="%g"),
+                        "pack_unit": "Pack Unit",
+                        "primary_strength_mg": st.column_config.NumberColumn("Strength (mg)", format="%g"),
+                        "price_inr": st.column_config.NumberColumn("Price (₹)", format="₹%,.2f"),
+                        "distance": st.column_config.NumberColumn("Distance", format="%.2f"),
+                    }
+                )
+                if match_level != 'primary_ingredient':
+                    st.caption("No product in the database has this active ingredient; these are the closest "
+                               + ("products of the same therapeutic class." if match_level == 'therapeutic_class'
+                                  else "products overall."))
+                
+                # Why this price: exact TreeSHAP contributions, one bar per input feature
+                st.markdown("#### 🔍 Why this price?")
+                contribs = contributions_many(load_model(), build_features(input_df), load_explanation_cache())[0]
+                effects, base_price = price_effects(contribs, input_row)
+                import plotly.express as px
+                with metrics.timer('chart', chart='explanation'):
+                    fig_why = px.bar(
+                        effects.iloc[::-1], x='effect_pct', y='label', orientation='h',
+                        color='effect_pct', color_continuous_scale='RdYlGn_r', color_continuous_midpoint=0,
+                        labels={'effect_pct': "Effect on price (%)", 'label': ""},
+                        title=f"Starting from the model's baseline of ₹{base_price:,.2f}"
+                    )
+                    fig_why.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+                                          coloraxis_showscale=False)
+                    st.plotly_chart(fig_why, use_container_width=True)
+                st.caption("Each bar multiplies the price (plus ₹1) by 1 + effect. The effects compound "
+                           "from the baseline to the prediction.")
+                
             except Exception as e:
+                metrics.inc('pharma_prediction_errors_total', path='single')
                 st.error(f"Error in prediction: {str(e)}")
 
+    # What-if Analysis
+    st.markdown("### 📈 What-if Analysis")
+    st.markdown("""
+    <div class="info-card">
+        <p>See how the predicted price of the product above changes with pack size and/or strength, all other inputs fixed. The whole grid is priced in one batch.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    sweep_ranges = load_sweep_ranges(data_version)
+    with st.form("what_if_form"):
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            swept = st.multiselect("Features to sweep", list(SWEEP_FEATURES), default=['pack_size'],
+                                   format_func=SWEEP_FEATURES.get, max_selections=2)
+        with col2:
+            points = st.number_input("Points per feature", min_value=10, max_value=1000, value=DEFAULT_POINTS, step=10,
+                                     help=f"Capped at {MAX_HEATMAP_POINTS} per feature when sweeping both")
+        with col3:
+            log_spaced = st.toggle("Log-spaced", value=True)
+        range_cols = st.columns(2)
+        axis_ranges = {}
+        for range_col, (feature, label) in zip(range_cols, SWEEP_FEATURES.items()):
+            low, high = sweep_ranges[feature]
+            with range_col:
+                axis_ranges[feature] = (
+                    st.number_input(f"{label} from", min_value=0.0, value=round(low, 2)),
+                    st.number_input(f"{label} to", min_value=0.0, value=round(high, 2)),
+                )
+        run_what_if = st.form_submit_button("📈 Run what-if")
+    
+    if run_what_if:
+        input_row = form_features(input_row)
+        if not swept:
+            st.warning("Pick pack size, strength or both to sweep.")
+        elif any(axis_ranges[feature][0] >= axis_ranges[feature][1] for feature in swept):
+            st.warning("Each range needs 'from' below 'to'.")
+        elif pd.isna(input_row['primary_strength_mg']) and 'primary_strength_mg' not in swept:
+            st.warning("Enter a primary strength in the form above, or sweep it.")
+        else:
+            import plotly.express as px
+            
+            n_points = int(points) if len(swept) == 1 else min(int(points), MAX_HEATMAP_POINTS)
+            axes = {feature: sweep_values(*axis_ranges[feature], n_points, log_spaced) for feature in swept}
+            try:
+                prices, seconds = price_grid(load_model(), input_row, axes, load_compiled_predictor())
+            except Exception as e:
+                metrics.inc('pharma_prediction_errors_total', path='what_if')
+                st.error(f"Error in what-if analysis: {str(e)}")
+            else:
+                axis_type = 'log' if log_spaced else 'linear'
+                with metrics.timer('chart', chart='what_if'):
+                    if len(swept) == 1:
+                        feature = swept[0]
+                        fig = px.line(x=axes[feature], y=prices, markers=n_points <= 50,
+                                      labels={'x': SWEEP_FEATURES[feature], 'y': "Predicted Price (₹)"},
+                                      title=f"Predicted price vs {SWEEP_FEATURES[feature].lower()}")
+                        fig.update_xaxes(type=axis_type)
+                        current = input_row[feature]
+                        if pd.notna(current) and axes[feature][0] <= current <= axes[feature][-1]:
+                            fig.add_vline(x=current, line_dash="dash", annotation_text="current")
+                    else:
+                        x_feature, y_feature = swept
+                        # rows of `prices` follow the first feature; plot it on the x axis
+                        fig = px.imshow(prices.T, x=axes[x_feature], y=axes[y_feature], origin='lower',
+                                        aspect='auto', color_continuous_scale='viridis',
+                                        labels={'x': SWEEP_FEATURES[x_feature], 'y': SWEEP_FEATURES[y_feature],
+                                                'color': "Price (₹)"},
+                                        title="Predicted price (₹)")
+                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+                    st.plotly_chart(fig, use_container_width=True)
+                st.caption(f"Priced {prices.size:,} grid points in one batch in {seconds * 1000:.1f} ms · "
+                           f"range ₹{prices.min():,.2f} – ₹{prices.max():,.2f}")
+
+    # Bulk Prediction
+    st.markdown("### 📦 Bulk Prediction")
+    st.markdown("""
+    <div class="info-card">
+        <p>Upload a CSV or Parquet file with the columns <code>manufacturer</code>, <code>dosage_form</code>, <code>pack_unit</code>,
+        <code>primary_ingredient</code>, <code>therapeutic_class</code>, <code>pack_size</code>, <code>num_active_ingredients</code>,
+        <code>is_discontinued</code> and <code>primary_strength</code> (or <code>primary_strength_mg</code>) to price a whole catalogue at once.</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    uploaded = st.file_uploader("Catalogue file", type=["csv", "parquet"])
+    chunk_size = st.number_input(
+        "Chunk Size",
+        min_value=100,
+        value=DEFAULT_CHUNK_SIZE,
+        step=1000,
+        help="Rows scored per model call"
+    )
+
+    explain_batch = st.checkbox(
+        "Explain predictions",
+        help="Add a contrib_<feature> column per input feature: its additive effect on log(price + 1). "
+             "Takes about 1 ms per row."
+    )
+    compare_batch = st.checkbox(
+        "Add comparable products",
+        help=f"Add the median price of each row's {COMPARABLE_K} closest products in the database "
+             "and the closest one's brand"
+    )
+
+    if uploaded is not None:
+        try:
+            batch_df = read_table(uploaded)
+            with st.spinner(f"Scoring {len(batch_df):,} rows..."):
+                results, stats = predict_batch(
+                    load_model(), batch_df, int(chunk_size), prediction_cache, explain_batch,
+                    load_explanation_cache(), load_comparable_index(data_version) if compare_batch else None
+                )
+            track_session_memory('bulk_prediction', results)
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Rows Scored", f"{stats.rows:,}")
+            col2.metric("Scoring Time", f"{stats.seconds:.2f}s")
+            col3.metric("Throughput", f"{stats.rows_per_sec:,.0f} rows/sec")
+
+            st.dataframe(results.head(100), use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Download Predictions (CSV)",
+                data=b"".join(iter_csv_bytes(
+                    results.iloc[i:i + int(chunk_size)] for i in range(0, len(results), int(chunk_size))
+                )),
+                file_name="price_predictions.csv",
+                mime="text/csv"
+            )
+        except Exception as e:
+            metrics.inc('pharma_prediction_errors_total', path='bulk')
+            st.error(f"Error in bulk prediction: {str(e)}")
+
 # --- 🔍 EXPLORER ---
 with tab3:
     st.markdown('<h2 class="sub-header">Product Database Explorer</h2>', unsafe_allow_html=True)
@@ -466,34 +784,44 @@ with tab3:
     with col2:
         search_type = st.selectbox(
             "Search Type",
-            ["Both", "Brand Names Only", "Ingredients Only"]
+            list(SEARCH_MODES)
         )
     
     if keyword:
-        if search_type == "Both":
-            filtered = df[
-                df["primary_ingredient"].str.contains(keyword, case=False, na=False) |
-                df["brand_name"].str.contains(keyword, case=False, na=False)
-            ]
-        elif search_type == "Brand Names Only":
-            filtered = df[df["brand_name"].str.contains(keyword, case=False, na=False)]
-        else:  # Ingredients Only
-            filtered = df[df["primary_ingredient"].str.contains(keyword, case=False, na=False)]
+        with metrics.timer('search', mode=search_type):
+            row_ids = load_search_index(data_version).search(keyword, search_type)
+        browser = load_result_browser(data_version)
+        summary = browser.summarize(row_ids)
         
         st.markdown(f"""
         <div class="info-card">
             <h4>📊 Search Results</h4>
-            <p>Found <strong>{len(filtered)}</strong> products matching your search</p>
+            <p>Found <strong>{summary.count:,}</strong> products matching your search</p>
         </div>
         """, unsafe_allow_html=True)
         
-        if len(filtered) > 0:
-            # Display results
-            display_df = filtered[['brand_name', 'manufacturer', 'primary_ingredient', 'therapeutic_class', 'price_inr']].copy()
-            display_df['price_inr'] = display_df['price_inr'].apply(lambda x: f"₹{x:,.2f}")
+        if summary.count > 0:
+            # Sorted and paged here; only the visible page is sent to the browser
+            col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+            with col1:
+                sort_label = st.selectbox("Sort by", list(SORT_OPTIONS))
+            with col2:
+                descending = st.toggle("Descending", value=False)
+            with col3:
+                page_size = st.selectbox("Rows per page", PAGE_SIZES)
+            n_pages = page_count(summary.count, page_size)
+            with col4:
+                # a new search or ordering starts again at page 1
+                page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1,
+                                       key=f"explorer_page:{keyword}:{search_type}:{sort_label}:{descending}:{page_size}")
+            
+            with metrics.timer('explorer_page'):
+                ordered = browser.sort(row_ids, SORT_OPTIONS[sort_label], ascending=not descending)
+                page_rows = browser.page(ordered, int(page) - 1, page_size)
+            track_session_memory('explorer', page_rows)
             
             st.dataframe(
-                display_df,
+                page_rows,
                 use_container_width=True,
                 hide_index=True,
                 column_config={
@@ -501,22 +829,24 @@ with tab3:
                     "manufacturer": "Manufacturer",
                     "primary_ingredient": "Active Ingredient",
                     "therapeutic_class": "Therapeutic Class",
-                    "price_inr": "Price (₹)"
+                    "price_inr": st.column_config.NumberColumn("Price (₹)", format="₹%,.2f")
                 }
             )
+            first = (int(page) - 1) * page_size
+            st.caption(f"Rows {first + 1:,}–{first + len(page_rows):,} of {summary.count:,} · page {int(page)} of {n_pages}")
             
             # Quick stats for search results
-            if len(filtered) > 1:
+            if summary.count > 1:
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    st.metric("Average Price", f"₹{filtered['price_inr'].mean():.2f}")
+                    st.metric("Average Price", f"₹{summary.mean_price:.2f}")
                 
                 with col2:
-                    st.metric("Price Range", f"₹{filtered['price_inr'].min():.2f} - ₹{filtered['price_inr'].max():.2f}")
+                    st.metric("Price Range", f"₹{summary.min_price:.2f} - ₹{summary.max_price:.2f}")
                 
                 with col3:
-                    st.metric("Manufacturers", f"{filtered['manufacturer'].nunique()}")
+                    st.metric("Manufacturers", f"{summary.n_manufacturers}")
     
     else:
         st.markdown("""
@@ -612,4 +942,21 @@ st.markdown("""
     <p>© 2025 Pharma Price Prediction System | Monica Mamondol</p>
     <p>Data based on Indian pharmaceutical market • Last updated: {}</p>
 </div>
-""".format(datetime.now().strftime("%B %Y")), unsafe_allow_html=True)
\ No newline at end of file
+""".format(datetime.now().strftime("%B %Y")), unsafe_allow_html=True)
+
+def format_bytes(n):
+    return f"{n / 1e6:,.1f} MB"
+
+with memory_panel.container():
+    with st.expander("🧠 Memory"):
+        dataset = load_dataset_handle(data_version)
+        process = process_memory()
+        session = st.session_state.get('memory', {})
+        st.caption(f"Shared dataset: {format_bytes(dataset.nbytes)} for {len(dataset):,} rows, held once per process")
+        st.caption(f"This session: {format_bytes(sum(session.values()))} of private frames"
+                   + "".join(f" · {name} {format_bytes(n)}" for name, n in session.items()))
+        st.caption(f"Process: {format_bytes(process['rss'])} resident"
+                   + (f" ({format_bytes(process['file'])} file-backed, {format_bytes(process['anonymous'])} private)"
+                      if 'file' in process else ""))
+
+startup.mark('first_render')
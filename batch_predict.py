@@ -0,0 +1,189 @@
+"""Bulk price prediction over CSV/Parquet files or DataFrames.
+
+Usage:
+    python batch_predict.py catalogue.csv predictions.csv --chunk-size 10000
+    python batch_predict.py catalogue.csv explained.csv --explain
+    python batch_predict.py catalogue.csv compared.csv --comparables pharma_data_cleaned.csv
+"""
+import argparse
+import io
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+from comparables import ComparableIndex
+from explain import contribution_frame, contributions_many
+from features import build_features, model_strength_parser
+from model_artifact import load_model
+from prediction_cache import frame_keys
+
+MODEL_PATH = "xgb_price_predictor.joblib"
+DEFAULT_CHUNK_SIZE = 10_000
+PREDICTION_COLUMN = "predicted_price_inr"
+
+
+@dataclass
+class BatchStats:
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def read_table(source, name=None):
+    """Read a CSV or Parquet file from a path or a file-like object (e.g. a Streamlit upload)."""
+    name = name or getattr(source, "name", None) or str(source)
+    if name.lower().endswith((".parquet", ".pq")):
+        return pd.read_parquet(source)
+    return pd.read_csv(source)
+
+
+def predict_prices(model, X):
+    """Predict prices in INR for an already-built feature frame.
+
+    A Pipeline is run step by step so preprocessing and the regressor are
+    timed separately; the result is identical to `model.predict`. Anything
+    else with a `predict` (e.g. a `model_artifact.ModelArtifact`) is called directly.
+    """
+    if hasattr(model, 'named_steps'):
+        with metrics.timer('preprocessing'):
+            Xt = model[:-1].transform(X)
+        with metrics.timer('regressor'):
+            pred_log = model[-1].predict(Xt)
+    else:
+        with metrics.timer('predict'):
+            pred_log = model.predict(X)
+    metrics.inc('pharma_predictions_total', len(X), engine='pipeline')
+    return np.expm1(pred_log)
+
+
+def iter_predictions(model, frame, chunk_size=DEFAULT_CHUNK_SIZE, stats=None, cache=None, explain=False,
+                     explain_cache=None, comparables=None):
+    """Yield `frame` in chunks of at most `chunk_size` rows with a price column added.
+
+    Features (including the strength parsing, with the model's parser version)
+    are built once for the whole frame; only the pipeline call is chunked, so
+    peak memory is bounded by the chunk. Comparables are found from the same
+    parsed strengths.
+    With a `PredictionCache`, only rows not already cached reach the model.
+    With `explain`, per-feature log-price contributions are added as
+    `contrib_<feature>` columns (see `explain.py`), cached in `explain_cache`.
+    With a `comparables.ComparableIndex`, each row also gets the median price
+    of its nearest real products and the closest one's brand.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    frame = pd.DataFrame(frame)
+    X = build_features(frame, model_strength_parser(model))
+    for start in range(0, len(X), chunk_size):
+        t0 = time.perf_counter()
+        X_chunk = X.iloc[start:start + chunk_size]
+        if cache is None:
+            prices = predict_prices(model, X_chunk)
+        else:
+            prices = cache.predict_many(frame_keys(X_chunk), lambda rows: predict_prices(model, X_chunk.iloc[rows]))
+        contribs = contributions_many(model, X_chunk, explain_cache) if explain else None
+        similar = comparables.price_summary(X_chunk) if comparables is not None else None
+        if stats is not None:
+            stats.seconds += time.perf_counter() - t0
+            stats.rows += len(prices)
+        chunk = frame.iloc[start:start + chunk_size].copy()
+        chunk[PREDICTION_COLUMN] = prices
+        if contribs is not None:
+            chunk = pd.concat([chunk, contribution_frame(contribs, index=chunk.index)], axis=1)
+        if similar is not None:
+            chunk = pd.concat([chunk, similar], axis=1)
+        yield chunk
+
+
+def predict_batch(model, frame, chunk_size=DEFAULT_CHUNK_SIZE, cache=None, explain=False, explain_cache=None,
+                  comparables=None):
+    """Score a whole frame. Returns `(results, BatchStats)`.
+
+    The results are gathered into one frame, so they must fit in memory next
+    to the input; use `iter_predictions` (or `predict_file`) to stream them.
+    """
+    stats = BatchStats()
+    chunks = list(iter_predictions(model, frame, chunk_size, stats, cache, explain, explain_cache, comparables))
+    results = pd.concat(chunks) if chunks else pd.DataFrame(frame).assign(**{PREDICTION_COLUMN: []})
+    return results, stats
+
+
+def iter_csv_bytes(chunks):
+    """Serialise result chunks as CSV, writing the header only once."""
+    for i, chunk in enumerate(chunks):
+        buf = io.StringIO()
+        chunk.to_csv(buf, index=False, header=(i == 0))
+        yield buf.getvalue().encode("utf-8")
+
+
+def write_parquet_chunks(chunks, path, frame):
+    """Write result chunks to `path` as Parquet, one row group per chunk.
+
+    The schema comes from the whole input `frame` plus the columns the first
+    chunk adds, so a chunk whose column happens to be all null still matches.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.Schema.from_pandas(frame, preserve_index=False)
+                added = pa.Schema.from_pandas(chunk.drop(columns=list(frame.columns)), preserve_index=False)
+                for field in added:
+                    schema = schema.append(field)
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        if writer is None:  # no rows: still write the (empty) table
+            frame.assign(**{PREDICTION_COLUMN: []}).to_parquet(path, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def predict_file(model, input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, explain=False, comparables=None):
+    """Score `input_path` and stream the results to `output_path` (CSV, or Parquet one row group per chunk)."""
+    frame = read_table(input_path)
+    stats = BatchStats()
+    chunks = iter_predictions(model, frame, chunk_size, stats, explain=explain, comparables=comparables)
+    if output_path.lower().endswith((".parquet", ".pq")):
+        write_parquet_chunks(chunks, output_path, frame)
+    else:
+        with open(output_path, "wb") as fh:
+            for block in iter_csv_bytes(chunks):
+                fh.write(block)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict prices for a catalogue file.")
+    parser.add_argument("input", help="CSV or Parquet file with the nine model features")
+    parser.add_argument("output", help="Where to write the results (.csv or .parquet)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--explain", action="store_true",
+                        help="Add per-feature log-price contributions (contrib_* columns)")
+    parser.add_argument("--comparables", metavar="CATALOGUE",
+                        help="Cleaned catalogue (e.g. pharma_data_cleaned.csv) to add comparable-product prices from")
+    args = parser.parse_args(argv)
+
+    for path in (args.input, args.comparables):
+        if path is not None and not os.path.exists(path):
+            parser.error(f"input file not found: {path}")
+    model = load_model(args.model)
+    comparables = ComparableIndex(read_table(args.comparables)) if args.comparables else None
+    stats = predict_file(model, args.input, args.output, args.chunk_size, args.explain, comparables)
+    print(f"Scored {stats.rows:,} rows in {stats.seconds:.2f}s ({stats.rows_per_sec:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Benchmark suite for the data, model, search and dashboard paths.
+
+Runs without Streamlit against synthetic datasets scaled relative to the real
+cleaned dataset, and reports latency percentiles, throughput and peak traced
+memory per case. Results are written as JSON. Passing an earlier results file
+with `--compare` flags cases whose median latency regressed beyond
+`--threshold`; the command then exits with status 1.
+
+Usage:
+    python benchmark.py --scales 1 10 100
+    python benchmark.py --scales 1 --compare benchmark_results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from aggregates import compute_aggregates
+from batch_predict import MODEL_PATH
+from data_store import load_dataset, store_path_for
+from explorer import DISPLAY_COLUMNS, PAGE_SIZES, ResultBrowser
+from fast_predictor import CompiledPredictor
+from model_artifact import artifact_path_for, is_fresh, load_artifact
+from features import build_features
+from search_index import SEARCH_MODES, SearchIndex
+from strength import parse_strength, parse_strength_value
+from synthetic_data import BASE_ROWS, make_dataset, vocabularies_from_model
+
+SEARCH_KEYWORDS = ["para", "amox", "cin", "a", "met", "vitamin", "zole", "xyz", "pan", "ceti"]
+BATCH_SIZE = 10_000
+
+
+def legacy_strength(text):
+    """The per-row parser `strength` replaced (first number, unit ignored): the baseline."""
+    if pd.isnull(text): return np.nan
+    match = re.search(r"(\d+\.?\d*)", str(text))
+    return float(match.group(1)) if match else np.nan
+
+
+def measure(fn, repeats=5, items=1, warmup=1):
+    """Time `repeats` calls of `fn` after `warmup` calls, then one more under tracemalloc."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = np.asarray(times)
+    p50, p95, p99 = np.percentile(times, [50, 95, 99]) * 1000
+    return {
+        'repeats': repeats,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(times.mean() * 1000),
+        'throughput_per_s': float(items / times.mean()) if times.mean() > 0 else None,
+        'items_per_call': items,
+        'peak_traced_mb': peak / 1e6,
+    }
+
+
+def run_scale(scale, model, compiled, workdir, repeats):
+    rows = max(1, int(BASE_ROWS * scale))
+    df = make_dataset(rows, vocabularies_from_model(model), with_strength_text=True)
+    csv_path = os.path.join(workdir, f"pharma_{scale:g}x.csv")
+    df.drop(columns='primary_strength').to_csv(csv_path, index=False)
+    store_path = store_path_for(csv_path)
+    X = build_features(df)
+    one_row = X.iloc[[0]]
+    one_dict = X.iloc[0].to_dict()
+    batch = X.iloc[:BATCH_SIZE]
+    strength_text = df['primary_strength']
+    data = load_dataset(csv_path)
+    heavy = max(1, repeats // 2)
+
+    def store_cold():
+        if os.path.exists(store_path):
+            os.remove(store_path)
+        load_dataset(csv_path)
+
+    index = SearchIndex(data)
+
+    def search_all():
+        for keyword in SEARCH_KEYWORDS:
+            for mode in SEARCH_MODES:
+                index.search(keyword, mode)
+
+    def search_scan():
+        for keyword in SEARCH_KEYWORDS:
+            (data['primary_ingredient'].str.contains(keyword, case=False, na=False, regex=False)
+             | data['brand_name'].str.contains(keyword, case=False, na=False, regex=False))
+
+    browser = ResultBrowser(data)
+    broad = index.search("a")
+
+    def explorer_page():
+        browser.summarize(broad)
+        browser.page(browser.sort(broad, 'price_inr', ascending=False), 0, PAGE_SIZES[0])
+
+    def explorer_full_format():
+        filtered = data.iloc[broad]
+        shown = filtered[DISPLAY_COLUMNS].copy()
+        shown['price_inr'] = shown['price_inr'].apply(lambda x: f"₹{x:,.2f}")
+        filtered['price_inr'].mean(), filtered['price_inr'].min(), filtered['price_inr'].max()
+        filtered['manufacturer'].nunique()
+
+    def dashboard_naive():
+        data.groupby('dosage_form', observed=True)['price_inr'].agg(['mean', 'count'])
+        data['manufacturer'].value_counts().head(10)
+        data['manufacturer'].nunique()
+        data['primary_ingredient'].nunique()
+        data['price_inr'].mean()
+
+    n_queries = len(SEARCH_KEYWORDS) * len(SEARCH_MODES)
+    cases = {
+        'load_data/read_csv': (lambda: pd.read_csv(csv_path), heavy, rows),
+        'load_data/store_cold': (store_cold, heavy, rows),
+        'load_data/store_warm': (lambda: load_dataset(csv_path), repeats, rows),
+        'predict/single_pipeline': (lambda: model.predict(one_row), repeats * 20, 1),
+        'predict/single_compiled': (lambda: compiled.predict_one(one_dict), repeats * 200, 1),
+        'predict/batch_pipeline': (lambda: model.predict(batch), heavy, len(batch)),
+        'predict/batch_compiled': (lambda: compiled.predict(batch), heavy, len(batch)),
+        'extract_strength/legacy_apply': (lambda: strength_text.apply(legacy_strength), heavy, rows),
+        'extract_strength/scalar_apply': (lambda: strength_text.apply(parse_strength_value), heavy, rows),
+        'extract_strength/parse_strength': (lambda: parse_strength(strength_text), heavy, rows),
+        'search/build_index': (lambda: SearchIndex(data), heavy, rows),
+        'search/index_queries': (search_all, repeats, n_queries),
+        'search/str_contains_scan': (search_scan, heavy, len(SEARCH_KEYWORDS)),
+        'explorer/sorted_page': (explorer_page, repeats, len(broad)),
+        'explorer/format_all_rows': (explorer_full_format, heavy, len(broad)),
+        'dashboard/aggregates': (lambda: compute_aggregates(data), heavy, rows),
+        'dashboard/naive_reaggregate': (dashboard_naive, repeats, 1),
+    }
+
+    results = []
+    for name, (fn, n, items) in cases.items():
+        print(f"  {scale:g}x {name} ...", file=sys.stderr, flush=True)
+        results.append({'case': name, 'scale': scale, 'rows': rows, **measure(fn, n, items)})
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as fh:
+        baseline = {(r['case'], r['scale']): r for r in json.load(fh)['results']}
+    regressions = []
+    print(f"\n{'case':36} {'scale':>6} {'base p50':>10} {'p50':>10} {'ratio':>7}")
+    for r in results:
+        old = baseline.get((r['case'], r['scale']))
+        if old is None or not old['p50_ms']:
+            continue
+        ratio = r['p50_ms'] / old['p50_ms']
+        flag = "  REGRESSION" if ratio > threshold else ""
+        scale = "-" if r['scale'] is None else f"{r['scale']:g}x"
+        print(f"{r['case']:36} {scale:>6} {old['p50_ms']:>10.3f} {r['p50_ms']:>10.3f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(r['case'])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark load, predict, search and dashboard paths.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="Dataset sizes as multiples of the real cleaned dataset")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--output", default=None,
+                        help="Results file (default: benchmark_results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="p50 slow-down ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    load = measure(lambda: joblib.load(args.model), max(1, args.repeats // 2))
+    model = joblib.load(args.model)
+    compiled = CompiledPredictor.from_pipeline(model)
+    results = [{'case': 'load_model/joblib', 'scale': None, 'rows': None, **load}]
+    artifact_path = artifact_path_for(args.model)
+    if is_fresh(artifact_path, args.model):
+        def load_artifact_eager():
+            artifact = load_artifact(artifact_path)
+            artifact.booster, artifact.categories
+
+        load = measure(load_artifact_eager, max(1, args.repeats // 2))
+        results.append({'case': 'load_model/artifact', 'scale': None, 'rows': None, **load})
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scales:
+            results.extend(run_scale(scale, model, compiled, workdir, args.repeats))
+
+    report = pd.DataFrame(results)[['case', 'scale', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s', 'peak_traced_mb']]
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:,.3f}'.format):
+        print(report.to_string(index=False))
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = args.output or os.path.join("benchmark_results", f"{stamp}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    meta = {
+        'timestamp': stamp,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'model': args.model,
+        'versions': {mod: getattr(sys.modules.get(mod), '__version__', None)
+                     for mod in ('numpy', 'pandas', 'sklearn', 'xgboost', 'pyarrow')},
+    }
+    with open(output, 'w') as fh:
+        json.dump({'meta': meta, 'results': results}, fh, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed beyond {args.threshold}x")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
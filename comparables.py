@@ -0,0 +1,259 @@
+"""Nearest-neighbour "comparable products" for a prediction.
+
+A product's comparables are the catalogue's closest real products: the same
+active ingredient (or, for an ingredient the catalogue doesn't have, the same
+therapeutic class; failing that, the whole catalogue), ranked by distance over
+the remaining features:
+
+* log strength and log pack size (a 2.7x difference counts 1), the number of
+  active ingredients and the discontinued flag, as numeric coordinates;
+* a fixed penalty for a different dosage form or pack unit.
+
+Manufacturer is left out on purpose: the point is to see what other makers
+charge for the same medicine.
+
+`ComparableIndex` is built once per dataset. Rows are grouped CSR style by
+ingredient and by therapeutic class, so a query reads only its own group, not a
+full-frame mask. Small groups are scanned with NumPy. Groups of
+`SORTED_MIN_ROWS` or more are reduced on first use to their distinct points
+(coordinates plus dosage form and pack unit), sorted by log strength. A query
+reads a window of points around its own strength and widens it until the k-th
+best full distance is no more than the strength gap to the nearest point left
+outside, which is a lower bound of the full distance, so the result is exact.
+"""
+import numpy as np
+import pandas as pd
+
+import metrics
+
+DEFAULT_K = 5
+SORTED_MIN_ROWS = 2_000
+COMPARABLE_COLUMNS = ['brand_name', 'manufacturer', 'dosage_form', 'pack_size', 'pack_unit',
+                      'primary_strength_mg', 'price_inr']
+
+# (feature, weight) of the numeric coordinates
+COORDINATES = [
+    ('primary_strength_mg', 1.0),  # on log1p scale
+    ('pack_size', 1.0),            # on log1p scale
+    ('num_active_ingredients', 0.5),
+    ('is_discontinued', 0.25),
+]
+_LOG_SCALED = {'primary_strength_mg', 'pack_size'}
+# distance added when a categorical feature differs
+PENALTIES = {'dosage_form': 1.0, 'pack_unit': 0.5}
+# group columns, most specific first; queries matching none search the whole catalogue
+LEVELS = ['primary_ingredient', 'therapeutic_class']
+CATALOGUE = 'catalogue'
+
+_QUERY_BLOCK = 1_000_000  # queries x members per brute-force distance matrix
+_WINDOW = 8  # initial points read on each side of a query's strength
+
+
+def coordinates(frame):
+    """`(n, 4)` weighted numeric coordinates of `frame`'s rows (missing values at 0)."""
+    columns = []
+    for name, weight in COORDINATES:
+        values = pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        if name in _LOG_SCALED:
+            values = np.log1p(np.clip(values, 0, None))
+        columns.append(np.nan_to_num(values, nan=0.0) * weight)
+    return np.column_stack(columns)
+
+
+class _Grouping:
+    """Row ids of `frame[column]` grouped by value: group g is `row_ids[row_ptr[g]:row_ptr[g + 1]]`."""
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.values = pd.Index(uniques)
+        valid = codes >= 0
+        order = np.argsort(codes[valid], kind='stable')
+        self.row_ids = np.flatnonzero(valid)[order]
+        counts = np.bincount(codes[valid], minlength=len(uniques))
+        self.row_ptr = np.concatenate(([0], np.cumsum(counts)))
+
+    def codes(self, values):
+        return self.values.get_indexer(pd.Index(values))
+
+    def members(self, code):
+        return self.row_ids[self.row_ptr[code]:self.row_ptr[code + 1]]
+
+
+class _SortedGroup:
+    """A large group's distinct points, sorted by log strength.
+
+    Point p has coordinates `coords[p]` and penalty codes `codes[name][p]`; its
+    rows are `row_ids[row_ptr[p]:row_ptr[p + 1]]`.
+    """
+
+    def __init__(self, coords, penalty_codes, members):
+        points = np.column_stack([coords[members]] + [penalty_codes[name][members] for name in PENALTIES])
+        # one integer per distinct point, then rows ordered by log strength and point
+        key = np.zeros(len(members), dtype=np.int64)
+        for column in points.T:
+            codes, uniques = pd.factorize(column)
+            key = pd.factorize(key * len(uniques) + codes)[0]  # stays below len(members)
+        order = np.lexsort((key, points[:, 0]))
+        key = key[order]
+        starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        self.row_ids = members[order]
+        self.row_ptr = np.append(starts, len(members))
+        self.counts = np.diff(self.row_ptr)
+        unique = points[order[starts]]
+        width = coords.shape[1]
+        self.coords = unique[:, :width]
+        self.codes = {name: unique[:, width + i].astype(np.int64) for i, name in enumerate(PENALTIES)}
+        self.first = np.ascontiguousarray(self.coords[:, 0])
+
+    def query(self, q_coords, q_codes, k):
+        """Rows and squared distances of the `k` nearest rows to one query point."""
+        n = len(self.first)
+        centre = np.searchsorted(self.first, q_coords[0])
+        width = _WINDOW
+        while True:
+            lo, hi = max(0, centre - width), min(n, centre + width)
+            diff = self.coords[lo:hi] - q_coords
+            full = np.einsum('pf,pf->p', diff, diff)
+            for name, weight in PENALTIES.items():
+                full += (self.codes[name][lo:hi] != q_codes[name]) * weight ** 2
+            # every point holds at least one row, so the k nearest points hold the k nearest rows
+            order = np.argpartition(full, k - 1)[:k] if k < len(full) else np.arange(len(full))
+            order = order[np.argsort(full[order], kind='stable')]
+            taken = np.cumsum(self.counts[lo:hi][order])
+            last = np.searchsorted(taken, k)  # first point that completes k rows
+            # every point outside [lo, hi) differs in strength by at least `gap`
+            gap = min(q_coords[0] - self.first[lo - 1] if lo > 0 else np.inf,
+                      self.first[hi] - q_coords[0] if hi < n else np.inf)
+            if last < len(order) and full[order[last]] <= gap ** 2 or (lo == 0 and hi == n):
+                break
+            width *= 4
+        points = lo + order[:last + 1]
+        rows = np.concatenate([self.row_ids[self.row_ptr[p]:self.row_ptr[p + 1]] for p in points])
+        return rows[:k], np.repeat(full[order[:last + 1]], self.counts[points])[:k]
+
+
+class ComparableIndex:
+    """Exact k-nearest comparable products of one dataset."""
+
+    def __init__(self, frame):
+        self.frame = frame[COMPARABLE_COLUMNS]
+        self.price = frame['price_inr'].to_numpy(dtype=np.float64)
+        self.coords = coordinates(frame)
+        self._penalty_codes = {}
+        self._penalty_values = {}
+        for name in PENALTIES:
+            codes, uniques = pd.factorize(frame[name])
+            self._penalty_codes[name] = codes
+            self._penalty_values[name] = pd.Index(uniques)
+        self._groupings = {name: _Grouping(frame[name]) for name in LEVELS}
+        self._all_rows = np.arange(len(frame))
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self.price)
+
+    def _sorted_group(self, key, members):
+        group = self._sorted.get(key)
+        if group is None:
+            with metrics.timer('comparables_group_build'):
+                group = self._sorted[key] = _SortedGroup(self.coords, self._penalty_codes, members)
+        return group
+
+    def _penalty(self, members, query_codes):
+        """`(queries, members)` categorical penalties."""
+        total = 0.0
+        for name, weight in PENALTIES.items():
+            differs = self._penalty_codes[name][members][None, :] != query_codes[name][:, None]
+            total = total + differs * weight ** 2
+        return total
+
+    def _brute(self, key, members, q_coords, q_codes, k):
+        ids = np.empty((len(q_coords), k), dtype=np.int64)
+        d2 = np.empty((len(q_coords), k))
+        coords = self.coords[members]
+        step = max(1, _QUERY_BLOCK // len(members))
+        for start in range(0, len(q_coords), step):
+            part = slice(start, start + step)
+            diff = coords[None, :, :] - q_coords[part, None, :]
+            full = np.einsum('qmf,qmf->qm', diff, diff) + self._penalty(members, {
+                name: codes[part] for name, codes in q_codes.items()})
+            best = np.argpartition(full, k - 1, axis=1)[:, :k] if k < len(members) else \
+                np.broadcast_to(np.arange(len(members)), full.shape)
+            best_d2 = np.take_along_axis(full, best, axis=1)
+            order = np.argsort(best_d2, axis=1, kind='stable')
+            ids[part] = members[np.take_along_axis(best, order, axis=1)]
+            d2[part] = np.take_along_axis(best_d2, order, axis=1)
+        return ids, d2
+
+    def _sorted_search(self, key, members, q_coords, q_codes, k):
+        group = self._sorted_group(key, members)
+        ids = np.empty((len(q_coords), k), dtype=np.int64)
+        d2 = np.empty((len(q_coords), k))
+        for i in range(len(q_coords)):
+            ids[i], d2[i] = group.query(q_coords[i], {name: codes[i] for name, codes in q_codes.items()}, k)
+        return ids, d2
+
+    def _resolve(self, X):
+        """Per query: the level it matched (index into `LEVELS`, `len(LEVELS)` for the catalogue) and its group."""
+        level = np.full(len(X), len(LEVELS), dtype=np.int64)
+        group = np.zeros(len(X), dtype=np.int64)
+        for i, name in enumerate(LEVELS):
+            codes = self._groupings[name].codes(X[name])
+            hit = (level == len(LEVELS)) & (codes >= 0)
+            level[hit] = i
+            group[hit] = codes[hit]
+        return level, group
+
+    def query_many(self, X, k=DEFAULT_K):
+        """`(row_ids, distances, levels)` of the `k` comparables of each row of feature frame `X`.
+
+        `row_ids` are positions in the indexed frame, nearest first, padded
+        with -1 (distance inf) when the matched group has fewer than `k`
+        products. `levels` names what the comparables share with the query:
+        one of `LEVELS` or `CATALOGUE`.
+        """
+        X = pd.DataFrame(X)
+        n = len(X)
+        row_ids = np.full((n, k), -1, dtype=np.int64)
+        d2 = np.full((n, k), np.inf)
+        if n == 0 or len(self) == 0:
+            return row_ids, np.sqrt(d2), np.array([CATALOGUE] * n, dtype=object)
+        with metrics.timer('comparables'):
+            q_coords = coordinates(X)
+            q_codes = {name: self._penalty_values[name].get_indexer(pd.Index(X[name])) for name in PENALTIES}
+            level, group = self._resolve(X)
+            keys = level * (len(self) + 1) + group
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            for key_id, key in enumerate(unique_keys):
+                rows = np.flatnonzero(inverse == key_id)
+                lvl, grp = divmod(int(key), len(self) + 1)
+                members = self._all_rows if lvl == len(LEVELS) else self._groupings[LEVELS[lvl]].members(grp)
+                kk = min(k, len(members))
+                search = self._sorted_search if len(members) >= SORTED_MIN_ROWS else self._brute
+                ids, dist = search((lvl, grp), members, q_coords[rows],
+                                   {name: codes[rows] for name, codes in q_codes.items()}, kk)
+                row_ids[rows, :kk] = ids
+                d2[rows, :kk] = dist
+        metrics.inc('pharma_comparable_queries_total', n)
+        names = np.array(LEVELS + [CATALOGUE], dtype=object)
+        return row_ids, np.sqrt(np.clip(d2, 0, None)), names[level]
+
+    def comparables(self, row, k=DEFAULT_K):
+        """The `k` comparables of one feature row (a dict) as a frame with a `distance` column, and the level."""
+        ids, distances, levels = self.query_many(pd.DataFrame([row]), k)
+        found = ids[0] >= 0
+        table = self.frame.iloc[ids[0][found]].assign(distance=distances[0][found])
+        return table, levels[0]
+
+    def price_summary(self, X, k=DEFAULT_K):
+        """Median comparable price, nearest comparable's brand and the match level per row of `X`."""
+        ids, _, levels = self.query_many(X, k)
+        prices = np.where(ids >= 0, self.price[np.clip(ids, 0, None)], np.nan)
+        median = np.nanmedian(prices, axis=1) if len(ids) else np.empty(0)  # every group has a product
+        brands = self.frame['brand_name'].to_numpy(dtype=object)
+        nearest = np.where(ids[:, 0] >= 0, brands[np.clip(ids[:, 0], 0, None)], None) if len(ids) else []
+        return pd.DataFrame({
+            'comparable_price_inr': median,
+            'nearest_comparable': nearest,
+            'comparable_match': levels,
+        }, index=pd.DataFrame(X).index)
@@ -0,0 +1,103 @@
+"""Memory/latency comparison of the dense and sparse (CSR) feature encodings.
+
+Trains the same XGBoost pipeline twice on the cleaned dataset, once with the
+dense one-hot matrix and once with CSR, and also scores the shipped artifact.
+
+Usage:
+    python compare_encoding.py --data pharma_data_cleaned.csv
+"""
+import argparse
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+from features import build_features, make_pipeline, uses_sparse_encoding
+
+
+def matrix_bytes(X):
+    if sp.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return np.asarray(X).nbytes
+
+
+def traced(fn, *args):
+    """Run `fn(*args)`; return its result, wall time and peak traced allocation."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn(*args)
+        seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def latency_ms(model, X, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.predict(X)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)) * 1000
+
+
+def profile(name, model, X_test, y_test, fit_seconds=None, fit_peak=None, repeats=20):
+    pre = model.named_steps['preprocessing']
+    encoded, encode_seconds, encode_peak = traced(pre.transform, X_test)
+    pred = np.expm1(model.predict(X_test))
+    return {
+        'pipeline': name,
+        'sparse': uses_sparse_encoding(model),
+        'encoded_mb': matrix_bytes(encoded) / 1e6,
+        'encode_peak_mb': encode_peak / 1e6,
+        'encode_s': encode_seconds,
+        'fit_s': fit_seconds,
+        'fit_peak_mb': None if fit_peak is None else fit_peak / 1e6,
+        'single_row_ms': latency_ms(model, X_test.iloc[:1], repeats),
+        'batch_ms': latency_ms(model, X_test, max(1, repeats // 10)),
+        'r2': r2_score(y_test, pred),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare dense vs sparse feature encoding.")
+    parser.add_argument("--data", default="pharma_data_cleaned.csv")
+    parser.add_argument("--model", default="xgb_price_predictor.joblib",
+                        help="Existing artifact to include in the comparison")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.data)
+    X = build_features(df)
+    y = df['price_inr']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    y_train_log = np.log1p(y_train)
+
+    rows = []
+    for sparse in (False, True):
+        pipeline = make_pipeline(sparse=sparse)
+        _, fit_seconds, fit_peak = traced(pipeline.fit, X_train, y_train_log)
+        name = "sparse (CSR)" if sparse else "dense"
+        rows.append(profile(name, pipeline, X_test, y_test, fit_seconds, fit_peak, args.repeats))
+
+    try:
+        artifact = joblib.load(args.model)
+    except FileNotFoundError:
+        artifact = None
+    if artifact is not None:
+        rows.append(profile(f"artifact ({args.model})", artifact, X_test, y_test, repeats=args.repeats))
+
+    report = pd.DataFrame(rows).set_index('pipeline')
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:,.3f}'.format):
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Dashboard figures, built once per dataset version and shared by every session.
+
+The Dashboard tab depends only on the dataset, so its plotly figures and the
+sample table are built once (a `st.cache_resource` keyed on the dataset
+version), not on every rerun of every session. `st.plotly_chart` still
+serializes the figure it is given, but that takes a few milliseconds.
+Building it with plotly express takes about 90. Passing a cached spec dict
+instead would make Streamlit validate it into a new figure (about 25 ms). The
+cached figures are shared and must not be modified.
+
+Charts are drawn from `aggregates.Aggregates`, never from rows, and at most
+`MAX_BARS` categories are drawn. The rest are pooled into one "Other" bar, so
+a figure's size depends on the bar count, not on the catalogue's size.
+"""
+from dataclasses import dataclass
+
+import pandas as pd
+
+MAX_BARS = 30
+SAMPLE_ROWS = 10
+OTHER = "Other"
+
+_TRANSPARENT = dict(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+
+
+@dataclass(frozen=True)
+class DashboardFigures:
+    dosage_form_bar: object
+    manufacturer_pie: object
+    sample: pd.DataFrame
+    # serialized size of each figure, in bytes
+    spec_bytes: dict
+
+
+def cap_categories(stats, limit=MAX_BARS):
+    """Group `mean`/`count` stats with every category past the `limit - 1` largest by count pooled into `OTHER`."""
+    if len(stats) <= limit:
+        return stats
+    keep = stats.nlargest(limit - 1, 'count')
+    rest = stats.drop(keep.index)
+    other = pd.DataFrame({
+        'mean': [(rest['mean'] * rest['count']).sum() / rest['count'].sum()],
+        'count': [rest['count'].sum()],
+    }, index=pd.Index([OTHER], name=stats.index.name))
+    return pd.concat([keep, other])
+
+
+def dosage_form_bar(agg):
+    import plotly.express as px
+
+    stats = agg.group_stats('dosage_form')[['mean', 'count']]
+    stats = stats.sort_values('mean', ascending=False)
+    stats = cap_categories(stats)
+    # "Other" goes last, whatever its average
+    stats = pd.concat([stats.drop(OTHER, errors='ignore'), stats.loc[stats.index == OTHER]])
+    stats = stats.reset_index()
+    stats['dosage_form'] = stats['dosage_form'].astype(str)
+    fig = px.bar(
+        stats,
+        x='dosage_form',
+        y='mean',
+        title='Average Price by Dosage Form',
+        color='mean',
+        color_continuous_scale='viridis'
+    )
+    fig.update_layout(xaxis_title="Dosage Form", yaxis_title="Average Price (₹)", **_TRANSPARENT)
+    return fig
+
+
+def manufacturer_pie(agg):
+    import plotly.express as px
+
+    top_manufacturers = agg.top_manufacturers
+    fig = px.pie(
+        values=top_manufacturers.values,
+        names=top_manufacturers.index.astype(str),
+        title='Market Share by Manufacturer'
+    )
+    fig.update_layout(**_TRANSPARENT)
+    return fig
+
+
+def build_dashboard(agg, frame):
+    import plotly.io as pio
+
+    figures = {'dosage_form_bar': dosage_form_bar(agg), 'manufacturer_pie': manufacturer_pie(agg)}
+    return DashboardFigures(
+        sample=frame.head(SAMPLE_ROWS).copy(),
+        spec_bytes={name: len(pio.to_json(fig, validate=False)) for name, fig in figures.items()},
+        **figures,
+    )
@@ -0,0 +1,221 @@
+"""Columnar, memory-mapped copy of the cleaned dataset.
+
+`pharma_data_cleaned.csv` stays the source of truth. It is converted once into
+an uncompressed Arrow IPC file with dictionary-encoded categorical columns and
+narrow numeric types. The app then memory-maps that file instead of re-parsing
+the CSV, so replicas on the same node share the pages through the OS cache.
+pyarrow is optional: without it the CSV is read directly with the same dtypes.
+
+`SharedDataset` is the process-wide, read-only handle the app keeps in a
+`st.cache_resource`: every session gets a shallow view of the same columns
+rather than its own copy. `private_nbytes` and `process_memory` measure what a
+session adds on top of it and what the whole process holds.
+
+Usage:
+    python data_store.py [pharma_data_cleaned.csv]
+"""
+import json
+import os
+import resource
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+DATA_PATH = "pharma_data_cleaned.csv"
+
+CATEGORY_COLUMNS = [
+    'manufacturer',
+    'dosage_form',
+    'pack_unit',
+    'primary_ingredient',
+    'therapeutic_class'
+]
+
+NUMERIC_DTYPES = {
+    'price_inr': 'float32',
+    'pack_size': 'float32',
+    'primary_strength_mg': 'float32',
+    'num_active_ingredients': 'int8',
+    'is_discontinued': 'boolean',  # nullable: a missing flag stays missing, not True
+}
+
+_VERSION_KEY = b'source_version'
+
+
+def dataset_version(path):
+    """Cheap change marker for a data file: (mtime_ns, size), or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def store_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+def apply_dtypes(df):
+    """Cast a freshly read frame to the compact dtypes used by the store."""
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col, dtype in NUMERIC_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'int8' and df[col].isna().any():
+            continue  # keep the float column rather than fail on missing counts
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def convert_csv(csv_path=DATA_PATH, store_path=None):
+    """Write the Arrow IPC copy of `csv_path`; returns the store path."""
+    if pa is None:
+        raise ImportError("pyarrow is required to build the columnar data store")
+    store_path = store_path or store_path_for(csv_path)
+    version = dataset_version(csv_path)
+    table = pa.Table.from_pandas(apply_dtypes(pd.read_csv(csv_path)), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _VERSION_KEY: json.dumps(version).encode(),
+    })
+
+    tmp_path = f"{store_path}.tmp-{os.getpid()}"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+def _store_version(store_path):
+    with pa.memory_map(store_path, 'r') as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    raw = metadata.get(_VERSION_KEY)
+    return tuple(json.loads(raw)) if raw else None
+
+
+def open_store(store_path):
+    """Memory-map the Arrow file; numeric buffers are not copied into the process."""
+    source = pa.memory_map(store_path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(
+        split_blocks=True,
+        types_mapper={pa.string(): pd.StringDtype("pyarrow"), pa.bool_(): pd.BooleanDtype()}.get,
+    )
+
+
+def load_dataset(csv_path=DATA_PATH, store_path=None):
+    """Load the cleaned dataset, (re)building the columnar store when the CSV changed."""
+    if pa is None:
+        return apply_dtypes(pd.read_csv(csv_path))
+
+    store_path = store_path or store_path_for(csv_path)
+    version = dataset_version(csv_path)
+    stale = not os.path.exists(store_path)
+    if not stale and version is not None:
+        stale = _store_version(store_path) != tuple(version)
+    if stale:
+        convert_csv(csv_path, store_path)
+    return open_store(store_path)
+
+
+class SharedDataset:
+    """Read-only handle on the cleaned dataset, loaded once per process.
+
+    `view()` returns a shallow copy: a new DataFrame over the same column
+    buffers. With pandas copy-on-write enabled (as `app.py` does), writing to a
+    view copies only the touched column, so sessions can't change each other's
+    data. From the Arrow store the numeric and category-code buffers are the
+    read-only memory map itself.
+    """
+
+    def __init__(self, csv_path=DATA_PATH, store_path=None):
+        self.path = csv_path
+        self.version = dataset_version(csv_path)
+        self._frame = load_dataset(csv_path, store_path)
+        self._buffers = _buffer_ranges(self._frame)
+
+    def __len__(self):
+        return len(self._frame)
+
+    def view(self, columns=None):
+        frame = self._frame if columns is None else self._frame[columns]
+        return frame.copy(deep=False)
+
+    @property
+    def nbytes(self):
+        return int(self._frame.memory_usage(deep=True).sum())
+
+    def column_memory(self):
+        """Bytes and dtype per column, largest first."""
+        usage = self._frame.memory_usage(deep=True, index=False)
+        report = pd.DataFrame({'dtype': self._frame.dtypes.astype(str), 'bytes': usage})
+        return report.sort_values('bytes', ascending=False)
+
+    def private_nbytes(self, frame):
+        """Bytes of `frame` not backed by this dataset's buffers (what a session adds)."""
+        return private_nbytes(frame, self._buffers)
+
+
+def _array_buffers(array):
+    """`(address, nbytes)` of the memory behind one column's array."""
+    chunked = getattr(array, '_pa_array', None)
+    if chunked is not None:  # pyarrow-backed strings
+        return [(buf.address, buf.size) for chunk in chunked.chunks for buf in chunk.buffers() if buf is not None]
+    data = getattr(array, '_ndarray', None)  # numpy-backed and Categorical codes
+    if data is None:
+        data = np.asarray(array)
+    if data.dtype == object:
+        return None  # Python objects; no single buffer to compare
+    return [(data.__array_interface__['data'][0], data.nbytes)]
+
+
+def _buffer_ranges(frame):
+    ranges = []
+    for col in frame.columns:
+        ranges.extend(_array_buffers(frame[col].array) or [])
+    return sorted(ranges)
+
+
+def private_nbytes(frame, shared_ranges):
+    """Bytes of `frame`'s columns and index that don't lie inside any of `shared_ranges`."""
+    def is_shared(address, size):
+        return any(start <= address and address + size <= start + length for start, length in shared_ranges)
+
+    total = 0 if isinstance(frame.index, pd.RangeIndex) else int(frame.index.memory_usage(deep=True))
+    for col in frame.columns:
+        buffers = _array_buffers(frame[col].array)
+        if buffers is None:
+            total += int(frame[col].memory_usage(deep=True, index=False))
+        else:
+            total += sum(size for address, size in buffers if not is_shared(address, size))
+    return total
+
+
+def process_memory():
+    """Resident memory of this process in bytes: total, and file-backed/shared vs private where known."""
+    report = {'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    fields = {'VmRSS': 'rss', 'RssAnon': 'anonymous', 'RssFile': 'file', 'RssShmem': 'shmem'}
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    report[fields[name]] = int(value.split()[0]) * 1024
+    except OSError:  # not Linux
+        report['rss'] = report['peak_rss']
+    return report
+
+
+if __name__ == "__main__":
+    path = convert_csv(sys.argv[1] if len(sys.argv) > 1 else DATA_PATH)
+    print(f"Wrote {path}")
@@ -0,0 +1,95 @@
+"""Server-side sorting, paging and summaries of Product Explorer results.
+
+A search returns positional row ids. `ResultBrowser` keeps, per dataset,
+the few arrays needed to work on such id sets without materialising the
+matched rows: the price column, manufacturer codes and a lazily built sort
+rank per column. Sorting is one argsort of the ranks of the matched ids;
+only the requested page of rows is then taken from the frame and sent to
+the browser, and the summary metrics come from one gather of the matched
+prices and manufacturer codes.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+DISPLAY_COLUMNS = ['brand_name', 'manufacturer', 'primary_ingredient', 'therapeutic_class', 'price_inr']
+SORT_OPTIONS = {
+    "Dataset order": None,
+    "Price": 'price_inr',
+    "Brand Name": 'brand_name',
+    "Manufacturer": 'manufacturer',
+    "Active Ingredient": 'primary_ingredient',
+}
+PAGE_SIZES = (25, 50, 100)
+
+
+@dataclass(frozen=True)
+class ResultSummary:
+    count: int
+    mean_price: float
+    min_price: float
+    max_price: float
+    n_manufacturers: int
+
+
+class ResultBrowser:
+    """Sort, page and summarize sets of positional row ids of one dataset."""
+
+    def __init__(self, frame, columns=DISPLAY_COLUMNS):
+        self.frame = frame[columns]
+        self.price = frame['price_inr'].to_numpy()
+        manufacturer = frame['manufacturer']
+        if isinstance(manufacturer.dtype, pd.CategoricalDtype):
+            self.manufacturer_codes = manufacturer.cat.codes.to_numpy()
+            self.n_manufacturer_codes = len(manufacturer.cat.categories)
+        else:
+            codes, uniques = pd.factorize(manufacturer)
+            self.manufacturer_codes, self.n_manufacturer_codes = codes, len(uniques)
+        self._ranks = {}
+
+    def rank(self, column):
+        """Each row's position in ascending order of `column` (ties share a rank, missing last)."""
+        return self._rank(column)[0]
+
+    def _rank(self, column):
+        cached = self._ranks.get(column)
+        if cached is None:
+            codes, uniques = pd.factorize(self.frame[column], sort=True)
+            # missing values get rank len(uniques), after every value
+            cached = self._ranks[column] = (np.where(codes < 0, len(uniques), codes), len(uniques))
+        return cached
+
+    def sort(self, row_ids, column=None, ascending=True):
+        """`row_ids` ordered by `column` (stable, missing values last; `None` keeps dataset order)."""
+        row_ids = np.asarray(row_ids)
+        if column is None:
+            return row_ids if ascending else row_ids[::-1]
+        ranks, missing = self._rank(column)
+        keys = ranks[row_ids]
+        if not ascending:
+            keys = np.where(keys == missing, 1, -keys)
+        return row_ids[np.argsort(keys, kind='stable')]
+
+    def page(self, row_ids, page, page_size):
+        """Rows of page `page` (0-based) of the already sorted `row_ids`."""
+        start = page * page_size
+        return self.frame.iloc[row_ids[start:start + page_size]]
+
+    def summarize(self, row_ids):
+        if len(row_ids) == 0:
+            return ResultSummary(0, np.nan, np.nan, np.nan, 0)
+        prices = self.price[row_ids]
+        codes = self.manufacturer_codes[row_ids]
+        seen = np.bincount(codes[codes >= 0], minlength=self.n_manufacturer_codes)
+        return ResultSummary(
+            count=len(row_ids),
+            mean_price=float(prices.mean(dtype=np.float64)),
+            min_price=float(prices.min()),
+            max_price=float(prices.max()),
+            n_manufacturers=int(np.count_nonzero(seen)),
+        )
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
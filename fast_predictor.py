@@ -0,0 +1,268 @@
+"""Compiled, pandas-free evaluator for the trained price pipeline.
+
+`CompiledPredictor.from_model(model)` reads the fitted encoder, scaler and
+booster (of a pipeline or a `model_artifact` directory) once and turns them into flat NumPy arrays:
+
+* each categorical feature becomes a `{value: category index}` dict, so a row
+  is 5 integer codes instead of thousands of one-hot columns;
+* the scaler becomes `(x - mean) / scale` on the 4 numeric features;
+* all trees are concatenated into one node table, and every split on a one-hot
+  column is rewritten as "code == category".
+
+Batches walk all trees for all rows at once, one tree level per NumPy step.
+Single rows go through Python source generated from the same table (plain
+nested `if`s), which avoids per-call NumPy overhead.
+
+Strength text in a row is parsed with the model's own parser version
+(`features.model_strength_parser`). The float32 comparisons match XGBoost's,
+and so do the dense-vs-sparse missing-value rules, so the output equals `model.predict` within float
+rounding (`verify` checks this).
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from features import CATEGORICAL_FEATURES, NUMERIC_FEATURES, model_strength_parser, numeric_value, uses_sparse_encoding
+from strength import parse_strength_value
+
+_NUMERIC = -1  # node_cat marker for splits on a numeric column
+
+
+class CompiledPredictor:
+
+    def __init__(self, vocabularies, mean, scale, nodes, roots, base_score, sparse, strength_parser):
+        self.vocabularies = vocabularies
+        self.mean = mean
+        self.scale = scale
+        self.sparse = sparse
+        self.strength_parser = strength_parser
+        self.base_score = np.float32(base_score)
+        (self.left, self.right, self.default_left, self.threshold,
+         self.node_feature, self.node_cat, self.is_leaf, self.leaf_value) = nodes
+        self.roots = roots
+        self.depth = _max_depth(self.left, self.right, roots)
+        self._single = None
+
+    @classmethod
+    def from_model(cls, model):
+        """Compile either a fitted pipeline or a `model_artifact.ModelArtifact`."""
+        if hasattr(model, 'named_steps'):
+            return cls.from_pipeline(model)
+        return cls.from_artifact(model)
+
+    @classmethod
+    def from_pipeline(cls, model):
+        preprocessor = model.named_steps['preprocessing']
+        booster = model.named_steps['regressor'].get_booster()
+
+        encoder = preprocessor.named_transformers_['cat']
+        scaler = preprocessor.named_transformers_['num']
+        columns = dict((name, cols) for name, _, cols in preprocessor.transformers_)
+        if list(columns.get('cat', [])) != CATEGORICAL_FEATURES or list(columns.get('num', [])) != NUMERIC_FEATURES:
+            raise ValueError("Unsupported pipeline layout: expected the 'cat'/'num' ColumnTransformer")
+        return cls._compile(encoder.categories_, scaler.mean_, scaler.scale_, booster, uses_sparse_encoding(model),
+                            model_strength_parser(model))
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls._compile(artifact.categories, artifact.mean, artifact.scale, artifact.booster, artifact.sparse,
+                            artifact.strength_parser)
+
+    @classmethod
+    def _compile(cls, categories_per_feature, mean, scale, booster, sparse, strength_parser):
+        # encoded column -> (feature index, category index) or (numeric index, _NUMERIC)
+        column_feature, column_cat = [], []
+        vocabularies = []
+        for f, categories in enumerate(categories_per_feature):
+            vocabularies.append({value: c for c, value in enumerate(categories)})
+            column_feature.extend([f] * len(categories))
+            column_cat.extend(range(len(categories)))
+        column_feature.extend(range(len(NUMERIC_FEATURES)))
+        column_cat.extend([_NUMERIC] * len(NUMERIC_FEATURES))
+        column_feature = np.asarray(column_feature, dtype=np.int32)
+        column_cat = np.asarray(column_cat, dtype=np.int32)
+
+        learner = json.loads(bytes(booster.save_raw(raw_format='json')))['learner']
+        if learner['objective']['name'] != 'reg:squarederror':
+            raise ValueError(f"Unsupported objective: {learner['objective']['name']}")
+        gbtree = learner['gradient_booster']
+        if gbtree['name'] != 'gbtree':
+            raise ValueError(f"Unsupported booster: {gbtree['name']}")
+        base_score = float(learner['learner_model_param']['base_score'].strip('[]').split(',')[0])
+
+        trees = gbtree['model']['trees']
+        best = booster.attr('best_iteration')
+        if best is not None:
+            trees = trees[:int(best) + 1]
+
+        lefts, rights, defaults, thresholds, splits, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            leaf = left == -1
+            lefts.append(np.where(leaf, -1, left + offset))
+            rights.append(np.where(leaf, -1, np.asarray(tree['right_children'], dtype=np.int64) + offset))
+            defaults.append(np.asarray(tree['default_left'], dtype=bool))
+            thresholds.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            splits.append(np.asarray(tree['split_indices'], dtype=np.int64))
+            roots.append(offset)
+            offset += len(left)
+
+        left = np.concatenate(lefts)
+        is_leaf = left == -1
+        split = np.concatenate(splits)
+        threshold = np.concatenate(thresholds)
+        nodes = (
+            np.where(is_leaf, np.arange(len(left)), left),    # leaves point at themselves
+            np.where(is_leaf, np.arange(len(left)), np.concatenate(rights)),
+            np.concatenate(defaults),
+            threshold,
+            np.where(is_leaf, 0, column_feature[split]),
+            np.where(is_leaf, _NUMERIC, column_cat[split]),
+            is_leaf,
+            np.where(is_leaf, threshold, np.float32(0)),       # leaf value is stored as split_condition
+        )
+        return cls(
+            vocabularies,
+            np.asarray(mean, dtype=np.float64),
+            np.asarray(scale, dtype=np.float64),
+            nodes,
+            np.asarray(roots, dtype=np.int64),
+            base_score,
+            bool(sparse),
+            strength_parser,
+        )
+
+    # --- Encoding ---
+    def encode_rows(self, rows):
+        """Turn feature dicts into (codes, scaled numerics)."""
+        codes = np.array([[vocab.get(row.get(name), -1)
+                           for name, vocab in zip(CATEGORICAL_FEATURES, self.vocabularies)]
+                          for row in rows], dtype=np.int32).reshape(len(rows), len(CATEGORICAL_FEATURES))
+        raw = np.array([[_number(row, name, self.strength_parser) for name in NUMERIC_FEATURES] for row in rows],
+                       dtype=np.float64).reshape(len(rows), len(NUMERIC_FEATURES))
+        return codes, ((raw - self.mean) / self.scale).astype(np.float32)
+
+    def encode_frame(self, X):
+        """Same as `encode_rows` for a feature DataFrame (see `features.build_features`)."""
+        codes = np.column_stack([
+            _lookup_codes(X[name], vocab)
+            for name, vocab in zip(CATEGORICAL_FEATURES, self.vocabularies)
+        ])
+        raw = X[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+        return codes, ((raw - self.mean) / self.scale).astype(np.float32)
+
+    # --- Evaluation ---
+    def predict_encoded(self, codes, nums):
+        """Log-price predictions for encoded rows (what `model.predict` returns)."""
+        n = len(codes)
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        rows = np.arange(n)[:, None]
+        for _ in range(self.depth):
+            feature = self.node_feature[node]
+            cat = self.node_cat[node]
+            numeric = cat == _NUMERIC
+            value = np.where(
+                numeric,
+                nums[rows, np.where(numeric, feature, 0)],
+                (codes[rows, np.where(numeric, 0, feature)] == cat).astype(np.float32),
+            )
+            missing = np.isnan(value)
+            if self.sparse:
+                missing |= value == 0  # absent CSR entries are missing to XGBoost
+            go_left = np.where(missing, self.default_left[node], value < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.base_score + self.leaf_value[node].sum(axis=1, dtype=np.float32)
+
+    def predict(self, X):
+        return self.predict_encoded(*self.encode_frame(X))
+
+    def predict_rows(self, rows):
+        return self.predict_encoded(*self.encode_rows(rows))
+
+    def predict_one(self, row):
+        """Log-price for one feature dict via the generated single-row evaluator."""
+        if self._single is None:
+            self._single = self._generate_single()
+        codes = [vocab.get(row.get(name), -1) for name, vocab in zip(CATEGORICAL_FEATURES, self.vocabularies)]
+        nums = [float(np.float32((_number(row, name, self.strength_parser) - mean) / scale))
+                for name, mean, scale in zip(NUMERIC_FEATURES, self.mean, self.scale)]
+        return self._single(codes, nums)
+
+    def predict_price(self, row):
+        """Price in INR for one feature dict; the fast path for interactive use."""
+        return float(np.expm1(self.predict_one(row)))
+
+    def _generate_single(self):
+        lines = ["def _predict(c, x):", f"    s = {float(self.base_score)!r}"]
+
+        def emit(node, indent):
+            pad = "    " * indent
+            if self.is_leaf[node]:
+                lines.append(f"{pad}s += {float(self.leaf_value[node])!r}")
+                return
+            f, cat = int(self.node_feature[node]), int(self.node_cat[node])
+            thr, default_left = float(self.threshold[node]), bool(self.default_left[node])
+            if cat == _NUMERIC:
+                v = f"x[{f}]"
+                missing = f"{v} != {v}" + (f" or {v} == 0.0" if self.sparse else "")
+                cond = f"{default_left} if ({missing}) else {v} < {thr!r}"
+            else:
+                hit_left = 1.0 < thr
+                miss_left = default_left if self.sparse else 0.0 < thr
+                if hit_left == miss_left:
+                    emit(self.left[node] if hit_left else self.right[node], indent)
+                    return
+                cond = f"c[{f}] {'==' if hit_left else '!='} {cat}"
+            lines.append(f"{pad}if {cond}:")
+            emit(self.left[node], indent + 1)
+            lines.append(f"{pad}else:")
+            emit(self.right[node], indent + 1)
+
+        for root in self.roots:
+            emit(int(root), 1)
+        lines.append("    return s")
+        namespace = {}
+        exec(compile("\n".join(lines), "<compiled-trees>", "exec"), namespace)
+        return namespace["_predict"]
+
+    def verify(self, model, X, atol=1e-4):
+        """Raise AssertionError unless both evaluators agree with `model.predict` on X."""
+        expected = model.predict(X)
+        batch = self.predict(X)
+        single = np.array([self.predict_one(row) for row in X.head(100).to_dict('records')])
+        worst = max(
+            float(np.max(np.abs(expected - batch), initial=0.0)),
+            float(np.max(np.abs(expected[:len(single)] - single), initial=0.0)),
+        )
+        if worst > atol:
+            raise AssertionError(f"Compiled predictor differs from pipeline by {worst:.3g}")
+        return worst
+
+
+def _lookup_codes(column, vocab):
+    """Vocabulary index for every value of `column`, -1 for unseen/missing."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # translate the (few) categories once, then index by the integer codes
+        lut = np.array([vocab.get(value, -1) for value in column.cat.categories] + [-1], dtype=np.int32)
+        return lut[column.cat.codes.to_numpy()]
+    return pd.to_numeric(column.map(vocab), errors='coerce').fillna(-1).to_numpy(dtype=np.int32)
+
+
+def _number(row, name, strength_parser):
+    value = row.get(name)
+    if name == 'primary_strength_mg' and value is None:
+        return parse_strength_value(row.get('primary_strength'), strength_parser)
+    return numeric_value(name, value)  # as `features.build_features` reads it
+
+
+def _max_depth(left, right, roots):
+    depth, frontier = 0, roots
+    while True:
+        children = np.concatenate([left[frontier], right[frontier]])
+        children = children[~np.isin(children, frontier)]
+        if len(children) == 0:
+            return depth
+        depth += 1
+        frontier = np.unique(children)
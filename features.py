@@ -0,0 +1,141 @@
+"""Feature definitions shared by the app, the notebook and the batch tools."""
+import numpy as np
+import pandas as pd
+
+from strength import LEGACY_PARSER, PARSER_VERSION, parse_strength, parse_strength_value
+
+CATEGORICAL_FEATURES = [
+    'manufacturer',
+    'dosage_form',
+    'pack_unit',
+    'primary_ingredient',
+    'therapeutic_class'
+]
+
+NUMERIC_FEATURES = [
+    'pack_size',
+    'num_active_ingredients',
+    'primary_strength_mg',
+    'is_discontinued'
+]
+
+FEATURES = CATEGORICAL_FEATURES + NUMERIC_FEATURES
+
+# accepted spellings of the `is_discontinued` flag besides numbers and bools
+_FLAG_WORDS = {'true': 1.0, 'false': 0.0}
+
+
+def make_preprocessor(sparse=True):
+    """ColumnTransformer used by the model pipeline.
+
+    With `sparse=True` the one-hot block stays CSR all the way into XGBoost;
+    `sparse_threshold=1.0` keeps the stacked output sparse regardless of density.
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    return ColumnTransformer([
+        ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=sparse), CATEGORICAL_FEATURES),
+        ('num', StandardScaler(), NUMERIC_FEATURES)
+    ], sparse_threshold=1.0 if sparse else 0.0)
+
+
+def make_pipeline(sparse=True, **xgb_params):
+    """Untrained preprocessing + XGBRegressor pipeline with the notebook's defaults."""
+    from sklearn.pipeline import Pipeline
+    from xgboost import XGBRegressor
+
+    params = dict(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42, n_jobs=-1)
+    params.update(xgb_params)
+    return Pipeline([
+        ('preprocessing', make_preprocessor(sparse)),
+        ('regressor', XGBRegressor(**params))
+    ])
+
+
+def uses_sparse_encoding(model):
+    """True if a fitted pipeline feeds a CSR matrix to its regressor.
+
+    XGBoost reads entries missing from a CSR matrix as *missing*, not 0, so a
+    model trained on the dense encoding must keep being scored densely.
+    """
+    preprocessor = model.named_steps['preprocessing']
+    return bool(getattr(preprocessor, 'sparse_output_', False))
+
+
+def model_strength_parser(model):
+    """The `strength` parser version a pipeline or artifact was trained with.
+
+    `train.py` and the notebook record it as `strength_parser` on the pipeline,
+    and `model_artifact` copies it into the manifest. Models from before that
+    were trained on the legacy first-number parse.
+    """
+    return getattr(model, 'strength_parser', LEGACY_PARSER)
+
+
+def numeric_value(name, value):
+    """One numeric feature value as a float, NaN if missing or unreadable.
+
+    `is_discontinued` also accepts bools and "true"/"false" (any case). This is
+    the per-value form of what `build_features` does to a column, so a row gets
+    the same numbers whichever path it takes.
+    """
+    if name == 'is_discontinued' and isinstance(value, str):
+        word = value.strip().lower()
+        if word in _FLAG_WORDS:
+            return _FLAG_WORDS[word]
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def feature_row(row, strength_parser=PARSER_VERSION):
+    """The nine features of one feature dict, in training order.
+
+    Rows are normalized one at a time before they are stacked with other
+    clients' rows: a null or absent `primary_strength_mg` is parsed from that
+    row's own `primary_strength` text (with parser version `strength_parser`),
+    the numeric features become floats (`numeric_value`), and a missing feature
+    raises `KeyError` just as `build_features` does for a one-row frame. Rows
+    from different clients therefore stack into a frame of the training dtypes.
+    """
+    row = dict(row)
+    if row.get('primary_strength_mg') is None:
+        if 'primary_strength' in row:
+            row['primary_strength_mg'] = parse_strength_value(row['primary_strength'], strength_parser)
+        elif 'primary_strength_mg' not in row:
+            raise KeyError("Missing column: primary_strength_mg (or primary_strength)")
+    missing = [col for col in FEATURES if col not in row]
+    if missing:
+        raise KeyError(f"Missing columns: {', '.join(missing)}")
+    return {col: numeric_value(col, row[col]) if col in NUMERIC_FEATURES else row[col] for col in FEATURES}
+
+
+def build_features(frame, strength_parser=PARSER_VERSION):
+    """Return the nine model features from `frame`, in training order.
+
+    `primary_strength_mg` is taken as-is when present, otherwise parsed from a
+    raw `primary_strength` text column with `strength.parse_strength` (parser
+    version `strength_parser`; pass `model_strength_parser(model)` to score).
+    """
+    frame = pd.DataFrame(frame)
+    if 'primary_strength_mg' not in frame.columns:
+        if 'primary_strength' not in frame.columns:
+            raise KeyError("Missing column: primary_strength_mg (or primary_strength)")
+        frame = frame.assign(primary_strength_mg=parse_strength(frame['primary_strength'], strength_parser))
+
+    missing = [col for col in FEATURES if col not in frame.columns]
+    if missing:
+        raise KeyError(f"Missing columns: {', '.join(missing)}")
+
+    X = frame[FEATURES].copy()
+    for col in NUMERIC_FEATURES:
+        if X[col].dtype == object or isinstance(X[col].dtype, pd.StringDtype):
+            # mixed client values: normalize each distinct one as `feature_row` does
+            codes, uniques = pd.factorize(X[col])
+            values = np.array([numeric_value(col, value) for value in uniques] + [np.nan])
+            X[col] = values[codes]
+        else:
+            X[col] = pd.to_numeric(X[col], errors="coerce").astype(float)
+    return X
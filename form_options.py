@@ -0,0 +1,82 @@
+"""Option lists and typeahead for the prediction form's categorical inputs.
+
+The options for each categorical feature are the trained encoder's own
+categories, so the form never offers a value the model would one-hot encode
+as all zeros. Each value carries its product count in the dataset. Both are
+computed once per (dataset, model) version.
+
+`OptionIndex.suggest(text)` returns at most `limit` values. It matches `text`
+against the start of any word of a value, case-insensitively, by binary
+search in a sorted array of word suffixes. With no text it returns the most
+common values. The form sends those few options to the browser instead of
+the full vocabulary.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from features import CATEGORICAL_FEATURES
+
+MAX_OPTIONS = 100
+TYPEAHEAD_MIN_VALUES = 200  # smaller vocabularies are sent whole
+
+_WORD_START = re.compile(r"(?:^|(?<=[\s\-/(,.+]))\w")
+
+
+class OptionIndex:
+    """Word-prefix lookup over one feature's values, most common first."""
+
+    def __init__(self, values, counts):
+        order = np.lexsort((np.asarray(values, dtype=object), -np.asarray(counts)))
+        self.values = np.asarray(values, dtype=object)[order]
+        self.counts = np.asarray(counts, dtype=np.int64)[order]
+        self._known = set(self.values)
+
+        # every word of every value starts one key; value ids are popularity ranks
+        keys, ids = [], []
+        for vid, text in enumerate(self.values):
+            lower = text.lower()
+            for match in _WORD_START.finditer(lower):
+                keys.append(lower[match.start():])
+                ids.append(vid)
+        key_order = np.argsort(np.asarray(keys, dtype=object), kind='stable')
+        self._keys = np.asarray(keys, dtype=object)[key_order]
+        self._ids = np.asarray(ids, dtype=np.int64)[key_order]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self._known
+
+    def suggest(self, text="", limit=MAX_OPTIONS):
+        """Values with a word starting with `text`, most common first."""
+        text = (text or "").strip().lower()
+        if not text:
+            return self.values[:limit].tolist()
+        lo = np.searchsorted(self._keys, text, side='left')
+        hi = np.searchsorted(self._keys, text + "\uffff", side='left')
+        return self.values[np.unique(self._ids[lo:hi])[:limit]].tolist()
+
+    def all(self):
+        return sorted(self.values.tolist())
+
+
+def model_categories(model):
+    """Known (non-missing) categories per categorical feature of a pipeline or `ModelArtifact`."""
+    if hasattr(model, 'named_steps'):
+        categories = model.named_steps['preprocessing'].named_transformers_['cat'].categories_
+    else:
+        categories = model.categories
+    return {name: [value for value in values if not pd.isnull(value)]
+            for name, values in zip(CATEGORICAL_FEATURES, categories)}
+
+
+def build_option_indexes(frame, model):
+    """`{feature: OptionIndex}` over the model's categories, counted in `frame`."""
+    indexes = {}
+    for name, values in model_categories(model).items():
+        counts = frame[name].value_counts() if name in frame.columns else pd.Series(dtype=np.int64)
+        indexes[name] = OptionIndex(values, counts.reindex(values, fill_value=0).to_numpy())
+    return indexes
@@ -0,0 +1,547 @@
+"""Load test for the Streamlit app and the prediction service.
+
+Starts a private copy of the app (and, with `--service`, of `service.py`) in
+a temporary directory, on a synthetic dataset from `synthetic_data.py`. Then
+it ramps the number of simulated users through `--users` and runs each level
+for `--stage-seconds`. Everything stays on localhost.
+
+A simulated user talks to the app over its websocket (`/_stcore/stream`),
+the same protocol a browser uses, so every step is a real script rerun. One
+journey is:
+
+1. open: a new session, i.e. the first run of the whole app (dashboard
+   included);
+2. search: two Explorer searches with keywords drawn from `SEARCH_KEYWORDS`;
+3. predict: submit the prediction form with a random pack size and strength.
+
+Users pause `--think-ms` (jittered) between steps. An API client scores one
+row at a time on `POST /predict` and, every `--batch-every` requests, sends
+`--batch-rows` rows to `POST /predict/batch`.
+
+For each level the report gives the p50/p95/p99 latency, throughput and
+errors of every step. It also gives the CPU use and peak RSS of every server
+process (the app, the service parent and its forked workers), read from
+/proc. Results are written as JSON. As with `benchmark.py`, `--compare`
+flags steps whose p95 grew beyond `--threshold` at the same user count and
+exits with status 1. `--max-p95-ms` stops the ramp once any step is slower
+than that.
+
+Usage:
+    python load_test.py --users 1 4 16 --stage-seconds 30
+    python load_test.py --users 2 8 --service --api-clients 4
+    python load_test.py --users 1 4 16 --compare load_test_results/baseline.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from batch_predict import MODEL_PATH
+from benchmark import SEARCH_KEYWORDS
+from features import FEATURES
+from model_artifact import artifact_path_for
+from synthetic_data import BASE_ROWS, make_dataset, vocabularies_from_model
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(HERE, "app.py")
+SERVICE_SCRIPT = os.path.join(HERE, "service.py")
+DATA_FILE = "pharma_data_cleaned.csv"
+
+# labels of the app widgets a journey drives
+SEARCH_LABEL = "🔍 Search for active ingredients or brand names"
+PREDICT_LABEL = "🎯 Predict Price"
+PACK_SIZE_LABEL = "Pack Size"
+STRENGTH_LABEL = "Primary Strength (mg)"
+
+SEARCHES_PER_JOURNEY = 2
+STARTUP_TIMEOUT = 120.0
+REQUEST_TIMEOUT = 120.0
+SAMPLE_INTERVAL = 0.5
+
+
+class AppSession:
+    """One simulated browser tab, driving the app over its websocket.
+
+    Like a browser, it keeps the value of every widget it has set and sends
+    all of them with each rerun; buttons are sent as one-shot triggers.
+    """
+
+    def __init__(self, base_url, timeout=REQUEST_TIMEOUT):
+        self.url = base_url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.timeout = timeout
+        self.widgets = {}  # label -> (widget type, id)
+        self._values = {}  # id -> WidgetState
+        self._ws = None
+        self._exit = contextlib.ExitStack()
+
+    def open(self):
+        from websockets.sync.client import connect
+
+        self._ws = self._exit.enter_context(
+            connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout))
+        return self.rerun()
+
+    def close(self):
+        self._exit.close()
+        self._ws = None
+
+    def _state(self, label):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        kind, widget_id = self.widgets[label]
+        return kind, WidgetState(id=widget_id)
+
+    def set(self, label, value):
+        kind, state = self._state(label)
+        if kind == 'number_input':
+            state.double_value = float(value)
+        else:
+            state.string_value = str(value)
+        self._values[state.id] = state
+
+    def rerun(self, click=None):
+        """Rerun the script (pressing the `click` button) and wait for it to finish.
+
+        Returns the number of errors the run displayed (exceptions and `st.error`).
+        """
+        from streamlit.proto.Alert_pb2 import Alert
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        states = list(self._values.values())
+        if click is not None:
+            _, trigger = self._state(click)
+            trigger.trigger_value = True
+            states.append(trigger)
+        message.rerun_script.widget_states.widgets.extend(states)
+        self._ws.send(message.SerializeToString())
+
+        errors = 0
+        deadline = time.monotonic() + self.timeout
+        while True:
+            reply = ForwardMsg()
+            reply.ParseFromString(self._ws.recv(timeout=max(0.0, deadline - time.monotonic())))
+            kind = reply.WhichOneof('type')
+            if kind == 'delta' and reply.delta.WhichOneof('type') == 'new_element':
+                element = reply.delta.new_element
+                name = element.WhichOneof('type')
+                widget = getattr(element, name)
+                if name == 'exception' or (name == 'alert' and widget.format == Alert.ERROR):
+                    errors += 1
+                elif getattr(widget, 'id', None) and hasattr(widget, 'label'):
+                    self.widgets[widget.label] = (name, widget.id)
+            elif kind == 'script_finished':
+                if reply.script_finished != ForwardMsg.FINISHED_SUCCESSFULLY:
+                    errors += 1
+                return errors
+
+
+class Recorder:
+    """Thread-safe `(step, seconds, ok)` samples of the current stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = []
+
+    def record(self, step, seconds, ok):
+        with self._lock:
+            self._samples.append((step, seconds, ok))
+
+    def timed(self, step, fn):
+        t0 = time.perf_counter()
+        try:
+            ok = fn() == 0
+        except Exception:
+            ok = False
+        self.record(step, time.perf_counter() - t0, ok)
+        return ok
+
+    def drain(self):
+        with self._lock:
+            samples, self._samples = self._samples, []
+        return samples
+
+
+def _think(seconds):
+    if seconds > 0:
+        time.sleep(random.uniform(0.5, 1.5) * seconds)
+
+
+def user_journeys(app_url, recorder, stop, think, keywords):
+    """Loop open -> searches -> predict on fresh sessions until `stop` is set."""
+    while not stop.is_set():
+        session = AppSession(app_url)
+        try:
+            if not recorder.timed('app/open', session.open):
+                _think(think)
+                continue
+            for _ in range(SEARCHES_PER_JOURNEY):
+                _think(think)
+                session.set(SEARCH_LABEL, random.choice(keywords))
+                recorder.timed('app/search', session.rerun)
+            _think(think)
+            session.set(PACK_SIZE_LABEL, random.choice([1, 5, 10, 15, 20, 30, 60, 100]))
+            session.set(STRENGTH_LABEL, random.choice(["5", "10", "50", "250", "500", "1000"]))
+            recorder.timed('app/predict', lambda: session.rerun(click=PREDICT_LABEL))
+            _think(think)
+        finally:
+            session.close()
+
+
+def _post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        response.read()
+        return 0 if response.status == 200 else 1
+
+
+def api_client(service_url, recorder, stop, rows, batch_rows, batch_every):
+    """Single-row `/predict` calls with a `/predict/batch` call every `batch_every` requests."""
+    n = 0
+    while not stop.is_set():
+        n += 1
+        if batch_every and n % batch_every == 0:
+            start = random.randrange(max(1, len(rows) - batch_rows))
+            batch = rows[start:start + batch_rows]
+            recorder.timed('api/predict_batch', lambda: _post(service_url + "/predict/batch", {"rows": batch}))
+        else:
+            row = random.choice(rows)
+            recorder.timed('api/predict', lambda: _post(service_url + "/predict", row))
+
+
+def _proc_usage(pid):
+    """`(cpu seconds, rss bytes)` of one process, or None once it's gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            fields = fh.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as fh:
+            rss_pages = int(fh.read().split()[1])
+    except (FileNotFoundError, ProcessLookupError, IndexError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    # fields[0] is field 3 of /proc/<pid>/stat; utime and stime are fields 14 and 15
+    return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            return [int(child) for child in fh.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+class ResourceSampler:
+    """Samples CPU and RSS of named server processes and their children from /proc."""
+
+    def __init__(self, processes, interval=SAMPLE_INTERVAL):
+        self.processes = processes  # name -> pid
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset()
+        self._sample()
+
+    def _labels(self):
+        labels = {}
+        for name, pid in self.processes.items():
+            labels[pid] = name
+            for child in _children(pid):
+                labels[child] = f"{name} worker {child}"
+        return labels
+
+    def _sample(self):
+        for pid, label in self._labels().items():
+            usage = _proc_usage(pid)
+            if usage is None:
+                continue
+            cpu, rss = usage
+            with self._lock:
+                self._cpu0.setdefault(label, cpu)
+                self._cpu[label] = cpu
+                self._peak_rss[label] = max(rss, self._peak_rss.get(label, 0))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def mark(self):
+        """`{process: {cpu_percent, peak_rss_mb}}` since the previous mark; starts a new period."""
+        self._sample()
+        with self._lock:
+            elapsed = max(time.monotonic() - self._t0, 1e-9)
+            usage = {label: {'cpu_percent': 100.0 * (self._cpu[label] - self._cpu0[label]) / elapsed,
+                             'peak_rss_mb': self._peak_rss[label] / 1e6}
+                     for label in self._cpu}
+            self._reset()
+        self._sample()
+        return usage
+
+    def _reset(self):
+        self._t0 = time.monotonic()
+        self._cpu0 = {}
+        self._cpu = {}
+        self._peak_rss = {}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, process, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} during startup")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not come up within {timeout:.0f}s")
+
+
+class LocalStack:
+    """The app (and optionally the service) on a synthetic dataset in a temporary directory."""
+
+    def __init__(self, model_path=MODEL_PATH, scale=0.1, service=False, workers=2, seed=0):
+        self.model_path = os.path.abspath(model_path)
+        self.scale = scale
+        self.service = service
+        self.workers = workers
+        self.seed = seed
+        self.processes = {}
+        self.app_url = self.service_url = None
+        self.rows = []
+
+    def __enter__(self):
+        self.workdir = tempfile.mkdtemp(prefix="pharma_load_")
+        try:
+            self._start()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _start(self):
+        frame = make_dataset(max(1, int(BASE_ROWS * self.scale)),
+                             vocabularies_from_model(joblib.load(self.model_path)), self.seed)
+        frame.to_csv(os.path.join(self.workdir, DATA_FILE), index=False)
+        self.rows = json.loads(frame[FEATURES].head(5_000).to_json(orient='records'))
+        for path in (self.model_path, artifact_path_for(self.model_path)):
+            if os.path.exists(path):
+                os.symlink(path, os.path.join(self.workdir, os.path.basename(path)))
+        model_file = os.path.basename(self.model_path)
+        env = dict(os.environ, PHARMA_MODEL_RELOAD_INTERVAL="0")
+        log = open(os.path.join(self.workdir, "server.log"), "wb")
+
+        port = _free_port()
+        self.processes['app'] = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP_SCRIPT, "--server.headless", "true",
+             "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+            cwd=self.workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        self.app_url = f"http://127.0.0.1:{port}"
+        if self.service:
+            port = _free_port()
+            self.processes['service'] = subprocess.Popen(
+                [sys.executable, SERVICE_SCRIPT, "--port", str(port), "--workers", str(self.workers),
+                 "--model", model_file, "--reload-interval", "0"],
+                cwd=self.workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            self.service_url = f"http://127.0.0.1:{port}"
+        _wait_for(self.app_url + "/_stcore/health", self.processes['app'])
+        if self.service:
+            _wait_for(self.service_url + "/health", self.processes['service'])
+
+    def __exit__(self, *exc):
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def summarize(samples, seconds):
+    """Per-step latency percentiles, throughput and error counts of one stage."""
+    steps = {}
+    for step, elapsed, ok in samples:
+        steps.setdefault(step, ([], [0]))
+        steps[step][0].append(elapsed)
+        steps[step][1][0] += not ok
+    results = {}
+    for step, (times, errors) in sorted(steps.items()):
+        times = np.asarray(times)
+        p50, p95, p99 = np.percentile(times, [50, 95, 99]) * 1000
+        results[step] = {
+            'requests': len(times),
+            'errors': errors[0],
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'mean_ms': float(times.mean() * 1000),
+            'throughput_per_s': len(times) / seconds,
+        }
+    return results
+
+
+def run_stage(stack, users, api_clients, seconds, think, keywords, batch_rows, batch_every, recorder, sampler):
+    stop = threading.Event()
+    threads = [threading.Thread(target=user_journeys, args=(stack.app_url, recorder, stop, think, keywords),
+                                daemon=True) for _ in range(users)]
+    if stack.service_url:
+        threads += [threading.Thread(target=api_client,
+                                     args=(stack.service_url, recorder, stop, stack.rows, batch_rows, batch_every),
+                                     daemon=True) for _ in range(api_clients)]
+    recorder.drain()
+    sampler.mark()
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join(REQUEST_TIMEOUT)
+    elapsed = time.perf_counter() - t0
+    return summarize(recorder.drain(), elapsed), sampler.mark(), elapsed
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as fh:
+        baseline = {(r['case'], r['users']): r for r in json.load(fh)['results']}
+    regressions = []
+    print(f"\n{'case':22} {'users':>6} {'base p95':>10} {'p95':>10} {'ratio':>7}")
+    for r in results:
+        old = baseline.get((r['case'], r['users']))
+        if old is None or not old['p95_ms']:
+            continue
+        ratio = r['p95_ms'] / old['p95_ms']
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{r['case']:22} {r['users']:>6} {old['p95_ms']:>10.1f} {r['p95_ms']:>10.1f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append((r['case'], r['users']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp simulated users against a local app and service.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrent app sessions per stage, in ramp order")
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--think-ms", type=float, default=500.0, help="Mean pause between a user's steps")
+    parser.add_argument("--scale", type=float, default=0.1,
+                        help="Synthetic dataset size as a multiple of the real cleaned dataset")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--service", action="store_true", help="Also start service.py and run API clients")
+    parser.add_argument("--workers", type=int, default=2, help="service.py worker processes")
+    parser.add_argument("--api-clients", type=int, default=2, help="Concurrent API clients per stage")
+    parser.add_argument("--batch-rows", type=int, default=500)
+    parser.add_argument("--batch-every", type=int, default=20,
+                        help="Every n-th API request is a batch (0: single rows only)")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Stop ramping once any step's p95 exceeds this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None,
+                        help="Results file (default: load_test_results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="p95 slow-down ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    recorder = Recorder()
+    results, resources = [], []
+    print(f"Starting a local app on {max(1, int(BASE_ROWS * args.scale)):,} synthetic rows ...",
+          file=sys.stderr, flush=True)
+    with LocalStack(args.model, args.scale, args.service, args.workers, args.seed) as stack:
+        keywords = SEARCH_KEYWORDS + pd.Series([row['primary_ingredient'] for row in stack.rows[:50]]).str[:4].tolist()
+        sampler = ResourceSampler({name: p.pid for name, p in stack.processes.items()}).start()
+        try:
+            # one unrecorded journey fills the per-process caches (model, indexes, figures)
+            session = AppSession(stack.app_url)
+            session.open()
+            session.close()
+            for users in args.users:
+                print(f"  {users} user(s) for {args.stage_seconds:g}s ...", file=sys.stderr, flush=True)
+                steps, usage, elapsed = run_stage(stack, users, args.api_clients, args.stage_seconds,
+                                                  args.think_ms / 1000, keywords, args.batch_rows,
+                                                  args.batch_every, recorder, sampler)
+                results.extend({'case': step, 'users': users, 'api_clients': args.api_clients if args.service else 0,
+                                'seconds': elapsed, **stats} for step, stats in steps.items())
+                resources.extend({'users': users, 'process': name, **stats} for name, stats in usage.items())
+                slowest = max((stats['p95_ms'] for stats in steps.values()), default=0.0)
+                if args.max_p95_ms is not None and slowest > args.max_p95_ms:
+                    print(f"  p95 {slowest:,.0f} ms exceeds {args.max_p95_ms:,.0f} ms; stopping the ramp",
+                          file=sys.stderr, flush=True)
+                    break
+        finally:
+            sampler.stop()
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:,.1f}'.format):
+        if results:
+            print(pd.DataFrame(results)[['users', 'case', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms',
+                                         'throughput_per_s']].to_string(index=False))
+        if resources:
+            print()
+            print(pd.DataFrame(resources)[['users', 'process', 'cpu_percent', 'peak_rss_mb']].to_string(index=False))
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = args.output or os.path.join("load_test_results", f"{stamp}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    meta = {
+        'timestamp': stamp,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'model': args.model,
+        'rows': max(1, int(BASE_ROWS * args.scale)),
+        'stage_seconds': args.stage_seconds,
+        'think_ms': args.think_ms,
+        'service_workers': args.workers if args.service else 0,
+    }
+    with open(output, 'w') as fh:
+        json.dump({'meta': meta, 'results': results, 'resources': resources}, fh, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} step(s) regressed beyond {args.threshold}x")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Lightweight in-process metrics with Prometheus text export.
+
+Counters and latency histograms are plain dicts behind one lock, so a timer
+costs a couple of `perf_counter` calls and a dict update, which is cheap
+enough to leave on under load. `render()` produces the Prometheus text
+exposition format. The service serves it on `GET /metrics`, merged across its
+forked workers by `WorkerMetrics`; the Streamlit app serves it from a small
+side-car HTTP server when `PHARMA_METRICS_PORT` is set.
+
+Set `PHARMA_TRACE=1` to also log one JSON line per timed span (logger
+`pharma.trace`), tagged with the current trace id (see `trace`).
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TRACE_ENABLED = os.environ.get("PHARMA_TRACE", "").lower() in ("1", "true", "yes")
+trace_logger = logging.getLogger("pharma.trace")
+_trace_id = contextvars.ContextVar("pharma_trace_id", default=None)
+
+_HELP = {
+    'pharma_stage_seconds': "Latency of instrumented stages",
+    'pharma_predictions_total': "Rows priced by the model",
+    'pharma_prediction_errors_total': "Failed prediction requests",
+    'pharma_microbatches_total': "Micro-batches scored by the service",
+    'pharma_microbatch_rows_total': "Rows scored through service micro-batches",
+    'pharma_model_reloads_total': "Model reload attempts by outcome",
+    'pharma_comparable_queries_total': "Products looked up in the comparables index",
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            hist[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            hist[1] += seconds
+            hist[2] += 1
+
+    def gauge(self, name, fn, help="", kind="gauge"):
+        """Register `fn() -> {labels_tuple: value}` (or a number) evaluated at render time.
+
+        Use `kind="counter"` when `fn` reports a cumulative count kept elsewhere.
+        """
+        with self._lock:
+            self._gauges[name] = (fn, help, kind)
+
+    def snapshot(self):
+        with self._lock:
+            return (dict(self._counters),
+                    {k: ([*v[0]], v[1], v[2]) for k, v in self._histograms.items()},
+                    dict(self._gauges))
+
+    def collect(self):
+        """Every series as plain JSON-able data, gauges evaluated now (see `render_collected`)."""
+        counters, histograms, gauges = self.snapshot()
+        collected = {
+            'counters': [[name, [list(pair) for pair in labels], value]
+                         for (name, labels), value in sorted(counters.items())],
+            'histograms': [[name, [list(pair) for pair in labels], buckets, total, count]
+                           for (name, labels), (buckets, total, count) in sorted(histograms.items())],
+            'gauges': [],
+        }
+        for name, (fn, help_text, kind) in sorted(gauges.items()):
+            try:
+                values = fn()
+            except Exception:
+                continue
+            if not isinstance(values, dict):
+                values = {(): values}
+            collected['gauges'].append([name, kind, help_text, [
+                [[list(pair) for pair in labels], _number(value)] for labels, value in sorted(values.items())]])
+        return collected
+
+    def render(self):
+        return render_collected([((), self.collect())])
+
+
+def render_collected(sources):
+    """Prometheus text for `(extra_labels, Registry.collect())` pairs, one family per metric name.
+
+    Extra labels (e.g. `(('worker', '0'),)`) keep the series of different
+    processes apart.
+    """
+    families = {}
+
+    def family(name, kind, help_text=""):
+        return families.setdefault(name, (kind, help_text or _HELP.get(name, name), []))[2]
+
+    for extra, collected in sources:
+        extra = tuple(tuple(pair) for pair in extra)
+        for name, labels, value in collected['counters']:
+            labels = extra + tuple(tuple(pair) for pair in labels)
+            family(name, "counter").append(f"{name}{_labels(labels)} {value}")
+        for name, labels, buckets, total, count in collected['histograms']:
+            labels = extra + tuple(tuple(pair) for pair in labels)
+            lines = family(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, buckets):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, kind, help_text, values in collected['gauges']:
+            lines = family(name, kind, help_text)
+            for labels, value in values:
+                lines.append(f"{name}{_labels(extra + tuple(tuple(pair) for pair in labels))} {value}")
+
+    out = []
+    for name, (kind, help_text, lines) in families.items():
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) else float(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+class WorkerMetrics:
+    """Merges the registries of forked worker processes for one `/metrics` endpoint.
+
+    Every worker keeps its own `REGISTRY`. `start` has it write a snapshot to
+    `<directory>/<worker>.json` every `interval` seconds, and `render` writes
+    a fresh one and then renders all workers' latest snapshots with a `worker`
+    label. Whichever worker answers a scrape, Prometheus sees every worker's
+    series, and each series only ever comes from one process, so it stays
+    monotonic.
+    """
+
+    def __init__(self, directory, worker, interval=1.0):
+        self.directory = directory
+        self.worker = str(worker)
+        self.interval = interval
+
+    def publish(self):
+        path = os.path.join(self.directory, f"{self.worker}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(REGISTRY.collect(), fh)
+        os.replace(tmp, path)
+
+    def start(self):
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.publish()
+                except OSError:
+                    pass  # directory gone: the server is shutting down
+
+        self.publish()
+        threading.Thread(target=run, name="metrics-publish", daemon=True).start()
+        return self
+
+    def render(self):
+        self.publish()
+        sources = []
+        for entry in sorted(os.listdir(self.directory), key=lambda name: (len(name), name)):
+            worker, ext = os.path.splitext(entry)
+            if ext != ".json":
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as fh:
+                    sources.append(((('worker', worker),), json.load(fh)))
+            except (OSError, ValueError):
+                continue
+        return render_collected(sources)
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+gauge = REGISTRY.gauge
+render = REGISTRY.render
+
+
+@contextmanager
+def timer(stage, **labels):
+    """Record the duration of the `with` block under `pharma_stage_seconds{stage=...}`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        REGISTRY.observe('pharma_stage_seconds', elapsed, stage=stage, **labels)
+        if TRACE_ENABLED:
+            trace_logger.info(json.dumps({
+                'trace_id': _trace_id.get(), 'stage': stage, 'ms': round(elapsed * 1000, 3), **labels,
+            }))
+
+
+def start_trace(trace_id=None):
+    """Set the trace id for the rest of the current thread/context (e.g. one Streamlit rerun)."""
+    _trace_id.set(trace_id or uuid.uuid4().hex[:16])
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Tag spans recorded inside the block with one trace id (for per-request logs)."""
+    token = _trace_id.set(trace_id or uuid.uuid4().hex[:16])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def register_cache(cache, name="default"):
+    """Expose a `PredictionCache`'s counters as gauges."""
+    gauge(f'pharma_cache_{name}_entries', lambda: cache.stats()['size'], "Entries in the prediction cache")
+    def events():
+        stats = cache.stats()
+        return {(('event', event),): stats[event]
+                for event in ('hits', 'misses', 'evictions', 'expirations', 'invalidations')}
+
+    gauge(f'pharma_cache_{name}_events_total', events, "Prediction cache lookups and removals", kind="counter")
+
+
+_readiness_check = None
+
+
+def set_readiness_check(fn):
+    """Have `GET /ready` on the metrics server answer from `fn() -> (ready, detail)`."""
+    global _readiness_check
+    _readiness_check = fn
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/ready":
+            ready, detail = _readiness_check() if _readiness_check else (True, "ready")
+            self._send(200 if ready else 503, detail + "\n", "text/plain")
+        elif path == "/metrics":
+            self._send(200, render(), "text/plain; version=0.0.4")
+        else:
+            self.send_error(404)
+
+    def _send(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve `/metrics` and `/ready` from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
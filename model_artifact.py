@@ -0,0 +1,332 @@
+"""Versioned, pickle-free model artifact.
+
+A directory holding:
+
+* `booster.ubj`: the XGBoost booster in its native binary (UBJSON) format;
+* `preprocessing.npz`: encoder vocabularies and scaler parameters as plain
+  arrays (`allow_pickle=False`);
+* `manifest.json`: format version, feature order, encoding, the strength
+  parser version (`strength_parser`; absent means `strength.LEGACY_PARSER`),
+  and a SHA-256 checksum for each file and for the joblib pipeline it was
+  exported from.
+
+`load_artifact` reads only the manifest. The arrays and the booster are
+loaded (and checksummed) on first use. Neither step imports scikit-learn, and
+nothing is unpickled. `ModelArtifact.predict` returns the same log-price
+values as the pipeline's `predict`.
+
+Usage:
+    python model_artifact.py export xgb_price_predictor.joblib [xgb_price_predictor]
+    python model_artifact.py verify xgb_price_predictor
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from features import CATEGORICAL_FEATURES, FEATURES, NUMERIC_FEATURES, model_strength_parser, uses_sparse_encoding
+from strength import LEGACY_PARSER
+
+ARTIFACT_FORMAT = "pharma-price-model"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+BOOSTER_FILE = "booster.ubj"
+ARRAYS_FILE = "preprocessing.npz"
+
+
+def artifact_path_for(model_path):
+    """`xgb_price_predictor.joblib` -> `xgb_price_predictor` (a directory)."""
+    root, ext = os.path.splitext(model_path)
+    return root if ext == ".joblib" else model_path + ".artifact"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_artifact(model, path, source_path=None):
+    """Write the fitted pipeline `model` as an artifact directory at `path` (replaced atomically)."""
+    preprocessor = model.named_steps['preprocessing']
+    regressor = model.named_steps['regressor']
+    columns = dict((name, cols) for name, _, cols in preprocessor.transformers_)
+    if list(columns.get('cat', [])) != CATEGORICAL_FEATURES or list(columns.get('num', [])) != NUMERIC_FEATURES:
+        raise ValueError("Unsupported pipeline layout: expected the 'cat'/'num' ColumnTransformer")
+
+    encoder = preprocessor.named_transformers_['cat']
+    scaler = preprocessor.named_transformers_['num']
+    arrays = {'num_mean': np.asarray(scaler.mean_, dtype=np.float64),
+              'num_scale': np.asarray(scaler.scale_, dtype=np.float64)}
+    missing_category = []
+    for name, categories in zip(CATEGORICAL_FEATURES, encoder.categories_):
+        values = [value for value in categories if not pd.isnull(value)]
+        if not all(isinstance(value, str) for value in values):
+            raise ValueError(f"Categories of {name} must be strings")
+        # sklearn sorts a missing-value category last
+        missing_category.append(len(values) < len(categories))
+        arrays[f'cat_{name}'] = _pack_strings(values)
+
+    booster = regressor.get_booster()
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp = tempfile.mkdtemp(prefix=".artifact-", dir=parent)
+    try:
+        with open(os.path.join(tmp, BOOSTER_FILE), "wb") as fh:
+            fh.write(booster.save_raw(raw_format='ubj'))
+        np.savez(os.path.join(tmp, ARRAYS_FILE), **arrays)
+
+        import xgboost
+        manifest = {
+            'format': ARTIFACT_FORMAT,
+            'format_version': FORMAT_VERSION,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'xgboost_version': xgboost.__version__,
+            'features': FEATURES,
+            'categorical_features': CATEGORICAL_FEATURES,
+            'numeric_features': NUMERIC_FEATURES,
+            'missing_category': missing_category,
+            'sparse': uses_sparse_encoding(model),
+            'strength_parser': model_strength_parser(model),
+            'target': 'log1p(price_inr)',
+            'n_features': int(booster.num_features()),
+            'best_iteration': None if booster.attr('best_iteration') is None else int(booster.attr('best_iteration')),
+            'files': {name: file_sha256(os.path.join(tmp, name)) for name in (BOOSTER_FILE, ARRAYS_FILE)},
+            'source_sha256': file_sha256(source_path) if source_path else None,
+        }
+        with open(os.path.join(tmp, MANIFEST), "w") as fh:
+            json.dump(manifest, fh, indent=2)
+        os.chmod(tmp, 0o755)  # mkdtemp creates it owner-only
+
+        if os.path.isdir(path):
+            old = tempfile.mkdtemp(prefix=".artifact-old-", dir=parent)
+            os.replace(path, os.path.join(old, "artifact"))
+            os.replace(tmp, path)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return manifest
+
+
+def remap_booster_features(booster, column_map, n_features):
+    """Copy of `booster` whose splits on encoded column `i` now read column `column_map[i]`.
+
+    Used to carry trees over to a wider one-hot layout (`train.update`) or onto
+    just the columns they split on (`explain`).
+    """
+    import xgboost as xgb
+
+    model = json.loads(bytes(booster.save_raw(raw_format='json')))
+    learner = model['learner']
+    learner['learner_model_param']['num_feature'] = str(n_features)
+    for tree in learner['gradient_booster']['model']['trees']:
+        leaf = np.asarray(tree['left_children']) == -1
+        split = np.asarray(tree['split_indices'], dtype=np.int64)
+        tree['split_indices'] = np.where(leaf, split, column_map[split]).tolist()
+        tree['tree_param']['num_feature'] = str(n_features)
+    learner['feature_names'] = []
+    learner['feature_types'] = []
+    remapped = xgb.Booster()
+    remapped.load_model(bytearray(json.dumps(model).encode("utf-8")))
+    return remapped
+
+
+class ModelArtifact:
+    """A loaded artifact. Behaves like the pipeline for `predict` (log price)."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.sparse = bool(manifest['sparse'])
+        self.strength_parser = manifest.get('strength_parser', LEGACY_PARSER)
+        self.n_jobs = None
+        self._arrays = None
+        self._booster = None
+        self._categories = None
+        self._codes = None
+
+    # --- Lazy parts ---
+    def _read_verified(self, name):
+        full = os.path.join(self.path, name)
+        with open(full, "rb") as fh:
+            payload = fh.read()
+        if hashlib.sha256(payload).hexdigest() != self.manifest['files'][name]:
+            raise ValueError(f"Checksum mismatch for {full}")
+        return payload
+
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            with np.load(io.BytesIO(self._read_verified(ARRAYS_FILE)), allow_pickle=False) as data:
+                self._arrays = {key: data[key] for key in data.files}
+        return self._arrays
+
+    @property
+    def booster(self):
+        if self._booster is None:
+            import xgboost as xgb
+            booster = xgb.Booster()
+            booster.load_model(bytearray(self._read_verified(BOOSTER_FILE)))
+            if self.n_jobs is not None:
+                booster.set_param({'nthread': self.n_jobs})
+            self._booster = booster
+        return self._booster
+
+    @property
+    def categories(self):
+        """Per categorical feature, the encoder's categories (NaN last where it was one)."""
+        if self._categories is None:
+            self._categories = [_unpack_strings(self.arrays[f'cat_{name}']) for name in CATEGORICAL_FEATURES]
+        return [values + ([np.nan] if missing else [])
+                for values, missing in zip(self._categories, self.manifest['missing_category'])]
+
+    @property
+    def mean(self):
+        return self.arrays['num_mean']
+
+    @property
+    def scale(self):
+        return self.arrays['num_scale']
+
+    def set_threads(self, n_jobs):
+        self.n_jobs = n_jobs
+        if self._booster is not None:
+            self._booster.set_param({'nthread': n_jobs})
+
+    # --- Inference ---
+    def encode(self, X):
+        """The matrix the pipeline's preprocessor would produce for feature frame `X`."""
+        if self._codes is None:
+            self._codes = [pd.Index(values[:len(values) - missing], dtype=object)
+                           for values, missing in zip(self.categories, self.manifest['missing_category'])]
+        n = len(X)
+        offsets = np.cumsum([0] + [len(index) + missing for index, missing
+                                   in zip(self._codes, self.manifest['missing_category'])])
+        cat_cols = []
+        for name, index, missing, offset in zip(CATEGORICAL_FEATURES, self._codes,
+                                                self.manifest['missing_category'], offsets):
+            values = X[name]
+            codes = index.get_indexer(values.astype(object))
+            if missing:
+                codes = np.where(values.isna().to_numpy() & (codes < 0), len(index), codes)
+            cat_cols.append(np.where(codes >= 0, codes + offset, -1))
+        cat_cols = np.column_stack(cat_cols) if cat_cols else np.empty((n, 0), dtype=np.int64)
+        nums = ((X[NUMERIC_FEATURES].to_numpy(dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+        n_cols = int(offsets[-1]) + len(NUMERIC_FEATURES)
+        num_cols = np.arange(len(NUMERIC_FEATURES)) + int(offsets[-1])
+
+        if not self.sparse:
+            dense = np.zeros((n, n_cols), dtype=np.float32)
+            rows, pos = np.nonzero(cat_cols >= 0)
+            dense[rows, cat_cols[rows, pos]] = 1.0
+            dense[:, num_cols] = nums
+            return dense
+
+        import scipy.sparse as sp
+        # absent entries are "missing" to XGBoost, so zeros must not be stored (as in sklearn's hstack)
+        cat_rows, cat_pos = np.nonzero(cat_cols >= 0)
+        num_rows, num_pos = np.nonzero(nums != 0)
+        rows = np.concatenate([cat_rows, num_rows])
+        cols = np.concatenate([cat_cols[cat_rows, cat_pos], num_cols[num_pos]])
+        data = np.concatenate([np.ones(len(cat_rows), dtype=np.float32), nums[num_rows, num_pos]])
+        return sp.csr_matrix((data, (rows, cols)), shape=(n, n_cols))
+
+    def predict(self, X):
+        best = self.manifest.get('best_iteration')
+        iteration_range = (0, best + 1) if best is not None else (0, 0)
+        return self.booster.inplace_predict(self.encode(X), iteration_range=iteration_range, missing=np.nan)
+
+
+def _pack_strings(values):
+    """Strings as one NUL-separated UTF-8 byte array (far smaller than a fixed-width `<U` array)."""
+    if any("\x00" in value for value in values):
+        raise ValueError("Category values may not contain NUL characters")
+    return np.frombuffer("\x00".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(packed):
+    text = packed.tobytes().decode("utf-8")
+    return text.split("\x00") if text else []
+
+
+def load_artifact(path):
+    """Read and validate an artifact's manifest; everything else loads on first use."""
+    with open(os.path.join(path, MANIFEST)) as fh:
+        manifest = json.load(fh)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a {ARTIFACT_FORMAT} artifact")
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version {manifest.get('format_version')} "
+                         f"(this build reads version {FORMAT_VERSION})")
+    if manifest.get('features') != FEATURES:
+        raise ValueError("Artifact feature order does not match features.FEATURES")
+    return ModelArtifact(path, manifest)
+
+
+def is_fresh(artifact_path, model_path):
+    """True if the artifact exists and was exported from the current `model_path` (or that is gone)."""
+    try:
+        with open(os.path.join(artifact_path, MANIFEST)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return False
+    if not os.path.exists(model_path):
+        return True
+    return manifest.get('source_sha256') == file_sha256(model_path)
+
+
+def load_model(model_path, prefer_artifact=True):
+    """Load the price model, preferring the pickle-free artifact next to `model_path`.
+
+    The artifact is used when it was exported from the current joblib file (or
+    the joblib file is absent, as in a slim image). Otherwise the pipeline is
+    unpickled and the artifact is re-exported for next time, as `data_store`
+    does for the Arrow copy of the dataset.
+    """
+    artifact_path = artifact_path_for(model_path)
+    if prefer_artifact and is_fresh(artifact_path, model_path):
+        return load_artifact(artifact_path)
+
+    import joblib
+    model = joblib.load(model_path)
+    if prefer_artifact:
+        try:
+            export_artifact(model, artifact_path, source_path=model_path)
+        except (OSError, ValueError):
+            pass  # read-only checkout or unsupported pipeline: keep using the pickle
+    return model
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 2 and argv[0] == "export":
+        import joblib
+
+        source = argv[1]
+        target = argv[2] if len(argv) > 2 else artifact_path_for(source)
+        model = joblib.load(source)
+        manifest = export_artifact(model, target, source_path=source)
+        print(f"Wrote {target} (format v{manifest['format_version']}, sparse={manifest['sparse']})")
+    elif len(argv) == 2 and argv[0] == "verify":
+        artifact = load_artifact(argv[1])
+        for name in artifact.manifest['files']:
+            artifact._read_verified(name)
+        print(f"{argv[1]}: checksums OK, {artifact.booster.num_boosted_rounds()} trees")
+    else:
+        print(__doc__.split("Usage:")[1].rstrip())
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
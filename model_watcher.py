@@ -0,0 +1,171 @@
+"""Zero-downtime model reloads.
+
+`ModelWatcher` keeps the serving model in one attribute, `current`, a
+`LoadedModel` holding the model, its compiled evaluator and the file
+fingerprint it was loaded from. A background thread polls the joblib file
+and its artifact manifest (both written atomically by `train.save_pipeline`)
+and, when either changes, loads the new model next to the old one:
+
+1. `model_artifact.load_model` (the artifact when fresh, else the pickle);
+2. the `prepare` hook (e.g. set XGBoost threads);
+3. a probe prediction, which must be finite;
+4. optionally `CompiledPredictor` plus its `verify` against the model (a
+   model that can't be compiled is served without it, as at startup).
+
+Only then is `current` replaced, a single reference assignment, so a request
+sees either the old model or the new one, never a mix. Requests already
+scoring keep the `LoadedModel` they read. A model that fails to load or
+validate is logged, counted and skipped until its files change again; the
+old model keeps serving. The initial load happens in the constructor; pass
+`validate_initial=False` to skip its probe (e.g. in a parent about to fork,
+which must not start XGBoost's thread pool) and call `validate()` once
+forked, before serving, to run the skipped checks.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from data_store import dataset_version
+from features import CATEGORICAL_FEATURES, FEATURES, NUMERIC_FEATURES
+from model_artifact import MANIFEST, artifact_path_for, load_model
+
+DEFAULT_INTERVAL = 30.0
+
+logger = logging.getLogger("pharma.model")
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    model: object
+    compiled: object
+    version: tuple
+    loaded_at: float
+
+
+def model_fingerprint(model_path):
+    """Change marker for the joblib file and its exported artifact."""
+    manifest = os.path.join(artifact_path_for(model_path), MANIFEST)
+    return dataset_version(model_path), dataset_version(manifest)
+
+
+def default_probe(model):
+    """A few feature rows built from the model's own vocabularies."""
+    if hasattr(model, 'named_steps'):
+        categories = model.named_steps['preprocessing'].named_transformers_['cat'].categories_
+    else:
+        categories = model.categories
+    rows = []
+    for i in range(3):
+        row = {}
+        for name, values in zip(CATEGORICAL_FEATURES, categories):
+            known = [value for value in values if not pd.isnull(value)]
+            row[name] = known[i % len(known)] if known else None
+        row.update({name: float(10 ** i) for name in NUMERIC_FEATURES})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=FEATURES)
+
+
+class ModelWatcher:
+    """Holds the serving model and swaps in a validated new one when its files change."""
+
+    def __init__(self, model_path, interval=DEFAULT_INTERVAL, compile=True, probe=None, prepare=None, on_swap=None,
+                 validate_initial=True):
+        self.model_path = model_path
+        self.interval = interval
+        self.compile = compile
+        self.probe = probe
+        self.prepare = prepare
+        self.on_swap = on_swap
+        self._failed = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.current = self._load(model_fingerprint(model_path), validate_initial)
+
+    def _check(self, model, compiled):
+        """Probe `model` (its predictions must be finite) and `verify` `compiled` against it.
+
+        Returns the compiled evaluator, or None if it disagrees with the model.
+        """
+        X = self.probe(model) if callable(self.probe) else self.probe
+        X = default_probe(model) if X is None else X
+        if not np.isfinite(model.predict(X)).all():
+            raise ValueError("model returned non-finite predictions on the probe rows")
+        if compiled is not None:
+            try:
+                compiled.verify(model, X)
+            except Exception:
+                logger.warning("serving %s without the compiled evaluator", self.model_path, exc_info=True)
+                compiled = None
+        return compiled
+
+    def _load(self, version, validate=True):
+        model = load_model(self.model_path)
+        if self.prepare is not None:
+            self.prepare(model)
+        compiled = None
+        if self.compile:
+            from fast_predictor import CompiledPredictor
+            try:
+                compiled = CompiledPredictor.from_model(model)
+            except Exception:
+                logger.warning("serving %s without the compiled evaluator", self.model_path, exc_info=True)
+        if validate:
+            compiled = self._check(model, compiled)
+        # loading a pickle newer than its artifact re-exports the artifact; that is not a new model
+        version = (version[0], model_fingerprint(self.model_path)[1])
+        return LoadedModel(model, compiled, version, time.time())
+
+    def validate(self):
+        """Run the checks the initial load skipped (`validate_initial=False`) on the current model.
+
+        A compiled evaluator that fails `verify` is dropped, so requests fall
+        back to the pipeline. Returns the (possibly updated) `current`.
+        """
+        with self._lock:
+            loaded = self.current
+            compiled = self._check(loaded.model, loaded.compiled)
+            if compiled is not loaded.compiled:
+                self.current = replace(loaded, compiled=compiled)
+            return self.current
+
+    def poll(self):
+        """Reload if the model files changed; returns True when a new model was swapped in."""
+        with self._lock:
+            version = model_fingerprint(self.model_path)
+            if version in (self.current.version, self._failed, (None, None)):
+                return False
+            try:
+                loaded = self._load(version)
+            except Exception:
+                self._failed = version
+                metrics.inc('pharma_model_reloads_total', result='rejected')
+                logger.exception("model reload from %s failed; keeping the current model", self.model_path)
+                return False
+            self.current = loaded
+            self._failed = None
+        metrics.inc('pharma_model_reloads_total', result='swapped')
+        logger.info("swapped in model %s (version %s)", self.model_path, version)
+        if self.on_swap is not None:
+            self.on_swap(loaded)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        """Poll on a daemon thread (call after forking: threads don't survive `fork`)."""
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,199 @@
+"""Process-wide LRU/TTL cache of price predictions.
+
+Keys are the nine model features normalised to plain Python values (with
+`primary_strength_mg` parsed from `primary_strength` text when needed, by the
+serving model's parser version), so
+the same product asked for from the form, the service or a batch file hits
+the same entry. The cache remembers the (mtime, size) of the model artifact
+and empties itself when that changes; a `model_watcher.ModelWatcher` also
+calls `invalidate()` when it swaps the serving model. A value computed while
+the cache was being invalidated is dropped rather than stored.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data_store import dataset_version
+from features import CATEGORICAL_FEATURES, FEATURES, feature_row, numeric_value
+from strength import PARSER_VERSION
+
+DEFAULT_MAXSIZE = 50_000
+DEFAULT_TTL = 3600.0
+
+_N_CATEGORICAL = len(CATEGORICAL_FEATURES)
+
+
+def feature_key(values):
+    """Hashable key for one row given its nine feature values in `FEATURES` order.
+
+    Numeric values go through `features.numeric_value`, as the model's inputs
+    do, so "false", False and 0.0 share a key and no client value raises here.
+    """
+    key = []
+    for i, (name, value) in enumerate(zip(FEATURES, values)):
+        if i >= _N_CATEGORICAL:
+            value = numeric_value(name, value)
+            key.append(None if np.isnan(value) else value)
+        elif value is None or (not isinstance(value, str) and pd.isnull(value)):
+            key.append(None)
+        else:
+            key.append(str(value))
+    return tuple(key)
+
+
+def row_key(row, strength_parser=PARSER_VERSION):
+    """`feature_key` for a feature dict as accepted by the form, service and batch paths (see `features.feature_row`)."""
+    return feature_key(list(feature_row(row, strength_parser).values()))
+
+
+def _built_key(values):
+    """`feature_key` for values already normalized by `build_features` (numerics are floats)."""
+    key = []
+    for i, value in enumerate(values):
+        if i >= _N_CATEGORICAL:
+            key.append(None if value != value else float(value))
+        elif value is None or (not isinstance(value, str) and pd.isnull(value)):
+            key.append(None)
+        else:
+            key.append(str(value))
+    return tuple(key)
+
+
+def frame_keys(X):
+    """Keys for every row of a feature frame from `features.build_features`."""
+    return [_built_key(values) for values in X[FEATURES].itertuples(index=False, name=None)]
+
+
+class PredictionCache:
+    """Thread-safe bounded LRU with a per-entry TTL and hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, model_path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.model_path = model_path
+        self._model_version = dataset_version(model_path) if model_path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped whenever the entries are dropped; a value computed before that is not stored
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _check_model(self):
+        """Drop everything if the model file changed (one `os.stat`; call with the lock held)."""
+        if self.model_path is None:
+            return
+        version = dataset_version(self.model_path)
+        if version != self._model_version:
+            self._model_version = version
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires >= now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def _store(self, key, value, now):
+        self._entries[key] = (value, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            self._check_model()
+            return self._lookup(key, time.monotonic())
+
+    def put(self, key, value, generation=None):
+        """Store `value`, unless the cache was invalidated since `generation` (see `get_or_compute`)."""
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._store(key, value, time.monotonic())
+
+    def get_or_compute(self, key, compute):
+        (value,), generation = self.get_many([key])
+        if value is None:
+            value = compute()
+            self.put(key, value, generation)
+        return value
+
+    def get_many(self, keys):
+        """`(values, generation)`: the cached value or None for each key, from one model check and one lock.
+
+        Pass `generation` to `put_many` with the values computed for the misses.
+        """
+        with self._lock:
+            self._check_model()
+            now = time.monotonic()
+            return [self._lookup(key, now) for key in keys], self._generation
+
+    def put_many(self, items, generation):
+        """Store `(key, value)` pairs, unless the cache was invalidated since `generation`."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            now = time.monotonic()
+            for key, value in items:
+                self._store(key, value, now)
+
+    def predict_many(self, keys, compute_batch):
+        """Cached values for `keys`; the misses are computed with one `compute_batch(positions)` call.
+
+        `compute_batch` receives the positions (into `keys`) of the unique missing keys and
+        must return one value per position.
+        """
+        values = np.empty(len(keys), dtype=np.float64)
+        missing = {}
+        cached, generation = self.get_many(keys)
+        for i, (key, value) in enumerate(zip(keys, cached)):
+            if value is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                values[i] = value
+        if missing:
+            first = [positions[0] for positions in missing.values()]
+            computed = compute_batch(first)
+            for positions, value in zip(missing.values(), computed):
+                values[positions] = value
+            self.put_many(((key, float(value)) for key, value in zip(missing, computed)), generation)
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def invalidate(self):
+        """Drop every entry because the model changed (counted, unlike `clear`)."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._model_version = dataset_version(self.model_path) if self.model_path else None
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,80 @@
+"""Substring search index for the Product Explorer.
+
+Built once per dataset: every distinct lowercased brand / ingredient name is
+split into trigrams, and each trigram points at the names that contain it.
+A query intersects the posting lists of its own trigrams, verifies the few
+surviving names with a plain substring check and maps them back to row ids.
+Keywords are matched literally (no regex), case-insensitively.
+"""
+import numpy as np
+import pandas as pd
+
+SEARCH_MODES = {
+    "Both": ("primary_ingredient", "brand_name"),
+    "Brand Names Only": ("brand_name",),
+    "Ingredients Only": ("primary_ingredient",),
+}
+
+_GRAM = 3
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class _ColumnIndex:
+    """Trigram index over the distinct values of one text column."""
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(pd.Series(values, dtype="string").str.lower())
+        self.values = pd.Series(uniques, dtype="object")
+
+        # rows grouped by value code, CSR style: rows of value v are
+        # row_ids[row_ptr[v]:row_ptr[v + 1]]
+        valid = codes >= 0
+        order = np.argsort(codes[valid], kind="stable")
+        self.row_ids = np.flatnonzero(valid)[order]
+        counts = np.bincount(codes[valid], minlength=len(uniques))
+        self.row_ptr = np.concatenate(([0], np.cumsum(counts)))
+
+        postings = {}
+        for vid, text in enumerate(self.values):
+            for gram in {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}:
+                postings.setdefault(gram, []).append(vid)
+        self.postings = {g: np.asarray(ids, dtype=np.int64) for g, ids in postings.items()}
+
+    def matching_values(self, keyword):
+        if len(keyword) < _GRAM:
+            # too short for the trigram index; scan the (small) vocabulary instead of the rows
+            hits = self.values.str.contains(keyword, regex=False, na=False).to_numpy()
+            return np.flatnonzero(hits)
+
+        grams = {keyword[i:i + _GRAM] for i in range(len(keyword) - _GRAM + 1)}
+        lists = sorted((self.postings.get(g, _EMPTY) for g in grams), key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        if len(keyword) == _GRAM:
+            return candidates
+        return np.array([vid for vid in candidates if keyword in self.values.iat[vid]], dtype=np.int64)
+
+    def search(self, keyword):
+        vids = self.matching_values(keyword)
+        if len(vids) == 0:
+            return _EMPTY
+        return np.concatenate([self.row_ids[self.row_ptr[v]:self.row_ptr[v + 1]] for v in vids])
+
+
+class SearchIndex:
+    """Case-insensitive substring search over brand and ingredient names."""
+
+    def __init__(self, frame, columns=("brand_name", "primary_ingredient")):
+        self.n_rows = len(frame)
+        self.columns = {col: _ColumnIndex(frame[col].to_numpy()) for col in columns}
+
+    def search(self, keyword, mode="Both"):
+        """Return the sorted positional row ids matching `keyword` under `mode`."""
+        keyword = (keyword or "").lower()
+        if not keyword:
+            return _EMPTY
+        hits = [self.columns[col].search(keyword) for col in SEARCH_MODES[mode]]
+        return np.unique(np.concatenate(hits))
@@ -0,0 +1,316 @@
+"""Headless HTTP prediction service.
+
+Loads the model once, then forks worker processes that share the loaded
+pipeline copy-on-write and serve from the same listening socket. Inside each
+worker, concurrent single-row requests are merged into micro-batches: the
+first request opens a short window (`--max-wait-ms`) and everything arriving
+within it, up to `--max-batch-size` rows, is scored in one `model.predict`.
+
+Each worker also polls the model file every `--reload-interval` seconds and
+swaps in a retrained model without dropping requests (see `model_watcher.py`).
+
+Workers publish their metrics to a shared temporary directory, so `/metrics`
+reports every worker's series, labelled `worker`, whichever worker answers
+(see `metrics.WorkerMetrics`).
+
+Endpoints:
+    GET  /health          -> {"status": "ok", "pid": ..., "worker": ...}
+    GET  /cache           -> prediction cache counters of the worker that answered
+    GET  /metrics         -> Prometheus metrics of all workers
+    POST /predict         -> body: one feature object, reply: {"price_inr": ...}
+    POST /predict/batch   -> body: {"rows": [...]}, reply: {"predictions": [...], ...}
+
+Usage:
+    python service.py --port 8000 --workers 4
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from batch_predict import DEFAULT_CHUNK_SIZE, MODEL_PATH, predict_batch, predict_prices
+from features import FEATURES, build_features, feature_row, model_strength_parser
+from model_watcher import DEFAULT_INTERVAL, ModelWatcher
+from prediction_cache import DEFAULT_MAXSIZE, DEFAULT_TTL, PredictionCache, row_key
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT_MS = 2.0
+REQUEST_TIMEOUT = 30.0
+
+
+class MicroBatcher:
+    """Collects single-row requests and scores them together on one thread.
+
+    Each row is normalized and validated on its own when it is submitted (see
+    `features.feature_row`), with the strength parser of the watcher's current
+    model, so a bad row fails only its own request and every row in a batch has
+    the same nine columns. Each batch is scored by the watcher's current model.
+    """
+
+    def __init__(self, watcher, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.watcher = watcher
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Queue one feature dict; returns a Future resolving to the price in INR.
+
+        Raises `KeyError` (a 400 to the client) for a row missing a feature.
+        """
+        row = feature_row(row, model_strength_parser(self.watcher.current.model))
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def predict(self, row, timeout=REQUEST_TIMEOUT):
+        return self.submit(row).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _score(self, rows):
+        loaded = self.watcher.current
+        X = build_features(pd.DataFrame(rows, columns=FEATURES))
+        if loaded.compiled is not None:
+            with metrics.timer('predict', engine='compiled'):
+                prices = np.expm1(loaded.compiled.predict(X))
+            metrics.inc('pharma_predictions_total', len(X), engine='compiled')
+            return prices
+        return predict_prices(loaded.model, X)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            metrics.inc('pharma_microbatches_total')
+            metrics.inc('pharma_microbatch_rows_total', len(batch))
+            rows = [row for row, _ in batch]
+            try:
+                prices = self._score(rows)
+            except Exception:
+                # one bad row must not fail its neighbours: retry each on its own
+                for row, future in batch:
+                    try:
+                        future.set_result(float(self._score([row])[0]))
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            for (_, future), price in zip(batch, prices):
+                future.set_result(float(price))
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    server_version = "PharmaPriceService/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = self.server.metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok", "pid": os.getpid(), "worker": self.server.metrics.worker})
+        elif self.path == "/cache":
+            cache = self.server.cache
+            self._send_json(200, cache.stats() if cache is not None else {"enabled": False})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = self.path if self.path in ("/predict", "/predict/batch") else "other"
+        with metrics.trace(self.headers.get("X-Request-ID")), metrics.timer('request', path=path):
+            self._handle_post()
+
+    def _handle_post(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+
+        try:
+            if self.path == "/predict":
+                if not isinstance(payload, dict):
+                    raise ValueError("expected a JSON object with the model features")
+                # parsed once here, so the cache key and the batcher see the same strength
+                row = feature_row(payload, model_strength_parser(self.server.watcher.current.model))
+                cache = self.server.cache
+                if cache is None:
+                    price = self.server.batcher.predict(row)
+                else:
+                    price = cache.get_or_compute(row_key(row), lambda: self.server.batcher.predict(row))
+                self._send_json(200, {"price_inr": price})
+            elif self.path == "/predict/batch":
+                rows = payload.get("rows") if isinstance(payload, dict) else payload
+                if not isinstance(rows, list):
+                    raise ValueError("expected {\"rows\": [...]}")
+                model = self.server.watcher.current.model
+                X = pd.DataFrame([feature_row(row, model_strength_parser(model)) for row in rows], columns=FEATURES)
+                results, stats = predict_batch(model, X, self.server.chunk_size, self.server.cache)
+                self._send_json(200, {
+                    "predictions": results["predicted_price_inr"].tolist(),
+                    "rows": stats.rows,
+                    "seconds": stats.seconds,
+                })
+            else:
+                self._send_json(404, {"error": "not found"})
+        except (KeyError, ValueError, TypeError) as e:
+            metrics.inc('pharma_prediction_errors_total', path=self.path, status=400)
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            metrics.inc('pharma_prediction_errors_total', path=self.path, status=500)
+            self._send_json(500, {"error": str(e)})
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, sock, watcher, max_batch_size, max_wait_ms, chunk_size=DEFAULT_CHUNK_SIZE, verbose=False,
+                 cache=None, worker_metrics=None):
+        super().__init__(sock.getsockname()[:2], PredictionHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.watcher = watcher
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.cache = cache
+        self.metrics = worker_metrics
+        self.batcher = MicroBatcher(watcher, max_batch_size, max_wait_ms)
+
+
+def open_socket(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def serve_worker(sock, watcher, args, worker_metrics):
+    cache = None
+    if args.cache_size > 0:
+        cache = PredictionCache(args.cache_size, args.cache_ttl, model_path=args.model)
+        metrics.register_cache(cache)
+        watcher.on_swap = lambda loaded: cache.invalidate()
+    # the parent skipped the probe and `verify` so as not to start XGBoost's threads before forking
+    watcher.validate()
+    watcher.start()
+    worker_metrics.start()
+    server = PredictionServer(sock, watcher, args.max_batch_size, args.max_wait_ms, args.chunk_size, args.verbose,
+                              cache, worker_metrics)
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve price predictions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="XGBoost threads per worker process")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--engine", choices=["compiled", "pipeline"], default="compiled",
+                        help="Evaluator for /predict micro-batches (see fast_predictor.py)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAXSIZE,
+                        help="Prediction cache entries per worker (0 disables the cache)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="Seconds")
+    parser.add_argument("--reload-interval", type=float, default=DEFAULT_INTERVAL,
+                        help="Seconds between checks for a new model file (0 disables hot reload)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    # Load before forking so every worker shares the same pages; no prediction
+    # happens in the parent, so no OpenMP thread pool exists at fork time.
+    def set_threads(model):
+        if hasattr(model, 'named_steps'):
+            model.named_steps['regressor'].n_jobs = args.threads_per_worker
+        else:
+            model.set_threads(args.threads_per_worker)
+
+    watcher = ModelWatcher(args.model, args.reload_interval, compile=args.engine == "compiled",
+                           prepare=set_threads, validate_initial=False)
+    sock = open_socket(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} worker(s)", flush=True)
+    metrics_dir = tempfile.mkdtemp(prefix="pharma-metrics-")
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        try:
+            serve_worker(sock, watcher, args, metrics.WorkerMetrics(metrics_dir, 0))
+        finally:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+        return
+
+    children = []
+    for worker in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                serve_worker(sock, watcher, args, metrics.WorkerMetrics(metrics_dir, worker))
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for pid in children:
+        os.waitpid(pid, 0)
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Startup timing and background warm-up for the Streamlit app.
+
+`app.py` imports this module first, which starts the clock, and calls
+`mark(name)` after each startup phase. The first script run records how long
+each phase took. `warm_up` loads the remaining resources (model, compiled
+predictor, search index) on a background thread after the first render.
+`is_ready()` reports whether warm-up has finished; it backs `GET /ready` on the
+metrics port, for readiness probes. The phase timings are exported as
+`pharma_startup_seconds{phase=...}` and logged on the `pharma.startup` logger.
+
+Run the module for a startup report: per-module import times of everything
+`app.py` imports, and the init time of each resource it loads.
+
+Usage:
+    python startup.py [--top 15]
+"""
+import argparse
+import ast
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger("pharma.startup")
+
+_clock = time.perf_counter()
+_phases = {}
+_lock = threading.Lock()
+_ready = threading.Event()
+_warmup_error = None
+
+
+def _record(name, seconds):
+    with _lock:
+        if name in _phases:  # only the first script run is a cold start
+            return False
+        _phases[name] = seconds
+    logger.info("startup phase %s: %.3fs", name, seconds)
+    return True
+
+
+def mark(name):
+    """Record the time since the previous mark (or this module's import) as phase `name`."""
+    global _clock
+    now = time.perf_counter()
+    _record(name, now - _clock)
+    _clock = now
+
+
+@contextmanager
+def phase(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - t0)
+
+
+def report():
+    """Recorded `(phase, seconds)` pairs in the order they happened."""
+    with _lock:
+        return list(_phases.items())
+
+
+def warm_up(steps):
+    """Run `(name, fn)` steps on a daemon thread; `is_ready()` turns true when all succeed."""
+    def run():
+        global _warmup_error
+        try:
+            for name, fn in steps:
+                with phase(f"warmup:{name}"):
+                    fn()
+        except Exception as exc:  # stay not-ready; the failing step is reported by /ready
+            _warmup_error = f"{name}: {exc}"
+            logger.exception("warm-up step %s failed", name)
+            return
+        _ready.set()
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def set_ready():
+    _ready.set()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def readiness():
+    """`(ready, detail)` for the `/ready` endpoint."""
+    if _ready.is_set():
+        return True, "ready"
+    return False, f"warm-up failed: {_warmup_error}" if _warmup_error else "warming up"
+
+
+metrics.gauge('pharma_startup_seconds', lambda: {(('phase', name),): seconds for name, seconds in report()},
+              "Duration of each startup phase of the first script run")
+metrics.set_readiness_check(readiness)
+
+
+# --- Offline report ---
+def app_imports(app_path="app.py"):
+    """`(module, deferred)` for every absolute import in `app_path`, in source order.
+
+    `deferred` is true for imports that are not at module level (e.g. inside a tab).
+    """
+    with open(app_path) as fh:
+        tree = ast.parse(fh.read())
+    top_level = {id(node) for node in tree.body}
+    modules = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            modules.setdefault(name, (node.lineno, id(node) not in top_level))
+    return [(name, deferred) for name, (_, deferred) in sorted(modules.items(), key=lambda item: item[1][0])]
+
+
+def import_times(modules):
+    """Cumulative import time per module (seconds) in a fresh interpreter, via `-X importtime`."""
+    code = "\n".join(f"import {module}" for module in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def init_times():
+    """Time the resources `app.py` loads, in the order it loads them (outside Streamlit)."""
+    from aggregates import compute_aggregates
+    from batch_predict import MODEL_PATH
+    from data_store import DATA_PATH, load_dataset
+    from fast_predictor import CompiledPredictor
+    from features import build_features
+    from model_artifact import load_model
+    from search_index import SearchIndex
+
+    resources = {}
+    steps = [
+        ('data', lambda: resources.setdefault('df', load_dataset(DATA_PATH))),
+        ('aggregates', lambda: compute_aggregates(resources['df'])),
+        ('model', lambda: resources.setdefault('model', load_model(MODEL_PATH))),
+        ('first_prediction', lambda: resources['model'].predict(build_features(resources['df'].head(1)))),
+        ('compiled_predictor', lambda: CompiledPredictor.from_model(resources['model'])),
+        ('search_index', lambda: SearchIndex(resources['df'])),
+    ]
+    times = []
+    for name, fn in steps:
+        t0 = time.perf_counter()
+        fn()
+        times.append((name, time.perf_counter() - t0))
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report where app.py spends its startup time.")
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest nested imports to list")
+    args = parser.parse_args(argv)
+
+    modules = app_imports(args.app)
+    times = import_times([module for module, _ in modules])
+    print(f"Imports of {args.app} (fresh interpreter; cumulative, counted where first imported):")
+    for module, deferred in modules:
+        print(f"  {module:32} {times.get(module, 0.0) * 1000:9.1f} ms{'  (deferred)' if deferred else ''}")
+    print("\nHeaviest modules overall:")
+    for module, seconds in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {module:32} {seconds * 1000:9.1f} ms")
+
+    print("\nResource init (after imports):")
+    total = 0.0
+    for name, seconds in init_times():
+        total += seconds
+        print(f"  {name:32} {seconds * 1000:9.1f} ms")
+    print(f"  {'total':32} {total * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
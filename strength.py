@@ -0,0 +1,139 @@
+"""Unit-aware parsing of `primary_strength` text into milligrams.
+
+One parser for every path. Training (`train.py`, the notebook) and inference
+(`features.build_features`, the prediction form, the service, the prediction
+cache and the compiled predictor) all go through it, so training and serving
+turn a strength string into the same `primary_strength_mg` value.
+
+Rules, applied to the first number in the text:
+
+* mass units are converted to mg: mcg/µg/ug x0.001, mg x1, g/gm x1000,
+  kg x1,000,000; a bare number is taken to be mg already;
+* concentrations become mg per ml (or per g): "250 mg/5 ml" -> 50,
+  "2 mg/ml" -> 2, and "1%" (w/v: 1 g per 100 ml) -> 10;
+* units with no mass equivalent (IU, units, a volume on its own) give NaN,
+  as does text without a number;
+* thousands separators are accepted ("1,000 mg").
+
+`parse_strength` works on whole columns. It factorizes the column so each
+distinct string is parsed once, parses those with vectorized `str.extract`
+and NumPy, and broadcasts the results back through the codes. A catalogue
+repeats a few thousand strengths over millions of rows, so parsing costs
+little more than the factorize. `parse_strength_value` handles one string
+with the same pattern and unit tables, memoized.
+
+A model must be scored with the parser its training data went through. This
+one is `PARSER_VERSION`. `LEGACY_PARSER` is the notebook's original rule, the
+first number as it stands, whatever its unit. Both functions take a `version`.
+Pipelines and artifacts record theirs as `strength_parser` (see
+`features.model_strength_parser`). A model without one, such as the shipped
+model and its `pharma_data_cleaned.csv`, was trained with the legacy rule.
+"""
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+MEMO_SIZE = 16_384
+PARSER_VERSION = 2
+LEGACY_PARSER = 1
+
+_MASS_MG = {
+    'mcg': 1e-3, 'µg': 1e-3, 'ug': 1e-3,
+    'mg': 1.0,
+    'g': 1e3, 'gm': 1e3,
+    'kg': 1e6,
+    '%': 10.0,  # w/v: 1 g per 100 ml = 10 mg per ml
+}
+# denominators of a concentration, in ml (or g for creams: "10 mg/g")
+_PER_AMOUNT = {'ml': 1.0, 'l': 1e3, 'g': 1.0, 'gm': 1.0, 'mg': 1e-3}
+
+_PATTERN = (
+    r"(?P<value>\d+(?:\.\d+)?|\.\d+)\s*"
+    r"(?P<unit>mcg|µg|ug|mg|gm|g|kg|iu|units?|%|ml)?(?![a-z])"
+    r"(?:\s*/\s*(?P<per_value>\d+(?:\.\d+)?)?\s*(?P<per_unit>ml|l|gm|g|mg)(?![a-z]))?"
+)
+_REGEX = re.compile(_PATTERN)
+_THOUSANDS = r"(?<=\d),(?=\d{3}(?!\d))"
+_THOUSANDS_REGEX = re.compile(_THOUSANDS)
+_LEGACY_PATTERN = r"(\d+\.?\d*)"
+_LEGACY_REGEX = re.compile(_LEGACY_PATTERN)
+
+
+def _check_version(version):
+    if version not in (LEGACY_PARSER, PARSER_VERSION):
+        raise ValueError(f"Unknown strength parser version {version!r} "
+                         f"(this build has {LEGACY_PARSER} and {PARSER_VERSION})")
+
+
+def _parse_distinct(text):
+    """mg values for a Series of distinct strings (vectorized)."""
+    text = text.astype("string").str.lower().str.replace(_THOUSANDS, "", regex=True)
+    parts = text.str.extract(_PATTERN)
+    value = pd.to_numeric(parts['value'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    unit = parts['unit']
+    factor = unit.map(_MASS_MG).to_numpy(dtype=np.float64, na_value=np.nan)
+    factor[unit.isna().to_numpy()] = 1.0  # a bare number is already mg
+
+    per_unit = parts['per_unit']
+    has_per = per_unit.notna().to_numpy()
+    per_value = pd.to_numeric(parts['per_value'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    per = np.where(np.isnan(per_value), 1.0, per_value) * per_unit.map(_PER_AMOUNT).to_numpy(
+        dtype=np.float64, na_value=np.nan)
+    divisor = np.where(has_per, per, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mg = value * factor / divisor
+    mg[~np.isfinite(mg)] = np.nan
+    return mg
+
+
+def _parse_distinct_legacy(text):
+    """The first number of each string, unit ignored (`LEGACY_PARSER`)."""
+    first = text.astype("string").str.extract(_LEGACY_PATTERN, expand=False)
+    return pd.to_numeric(first, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def parse_strength(values, version=PARSER_VERSION):
+    """`primary_strength_mg` for a column of strength strings (same index, NaN where unparseable)."""
+    _check_version(version)
+    values = pd.Series(values)
+    codes, distinct = pd.factorize(values)
+    mg = np.full(len(values), np.nan)
+    if len(distinct):
+        parse = _parse_distinct if version == PARSER_VERSION else _parse_distinct_legacy
+        parsed = parse(pd.Series(distinct))
+        valid = codes >= 0
+        mg[valid] = parsed[codes[valid]]
+    return pd.Series(mg, index=values.index, name='primary_strength_mg')
+
+
+def _convert(value, unit, per_value, per_unit):
+    factor = 1.0 if unit is None else _MASS_MG.get(unit, np.nan)
+    divisor = 1.0
+    if per_unit is not None:
+        divisor = (1.0 if per_value is None else float(per_value)) * _PER_AMOUNT[per_unit]
+    if divisor == 0:
+        return np.nan
+    mg = float(value) * factor / divisor
+    return mg if np.isfinite(mg) else np.nan
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _parse_text(text, version):
+    if version == LEGACY_PARSER:
+        match = _LEGACY_REGEX.search(text)
+        return np.nan if match is None else float(match.group(1))
+    match = _REGEX.search(_THOUSANDS_REGEX.sub("", text.lower()))
+    if match is None:
+        return np.nan
+    return _convert(match.group('value'), match.group('unit'), match.group('per_value'), match.group('per_unit'))
+
+
+def parse_strength_value(text, version=PARSER_VERSION):
+    """`primary_strength_mg` for one strength string (or number); NaN if it can't be parsed."""
+    _check_version(version)
+    if text is None or (not isinstance(text, str) and pd.isnull(text)):
+        return np.nan
+    return _parse_text(str(text), version)
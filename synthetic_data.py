@@ -0,0 +1,77 @@
+"""Synthetic stand-ins for `pharma_data_cleaned.csv`, for benchmarks and load tests.
+
+Categorical values are drawn from the trained encoder's vocabularies (with a
+skewed, catalogue-like frequency) so predictions exercise real tree paths,
+and brand names are derived from ingredient names so Explorer searches find
+realistic numbers of matches.
+
+Usage:
+    python synthetic_data.py out.csv --scale 10
+"""
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from features import CATEGORICAL_FEATURES
+
+# Rows in the cleaned Kaggle dataset (the trained booster saw 162,145 = 80% of it).
+BASE_ROWS = 202_681
+
+_BRAND_SUFFIXES = np.array(["", " Forte", " Plus", " DS", " SR", " XR", " Kid", " 500", " MR", " Gel"])
+_STRENGTH_UNITS = np.array(["mg", "mg", "mg", "mcg", "g", "%", "mg/ml", "IU"])
+
+
+def vocabularies_from_model(model):
+    encoder = model.named_steps['preprocessing'].named_transformers_['cat']
+    return {name: np.asarray(cats) for name, cats in zip(CATEGORICAL_FEATURES, encoder.categories_)}
+
+
+def _skewed_choice(rng, values, n, a=1.3):
+    """Zipf-like sampling: a few values are very common, most are rare."""
+    weights = 1.0 / np.arange(1, len(values) + 1) ** a
+    order = rng.permutation(len(values))
+    return values[order][rng.choice(len(values), size=n, p=weights / weights.sum())]
+
+
+def make_dataset(n_rows, vocabularies, seed=0, with_strength_text=False):
+    rng = np.random.default_rng(seed)
+    ingredient = _skewed_choice(rng, vocabularies['primary_ingredient'], n_rows, a=1.0)
+    strength = rng.choice([0.5, 5, 10, 20, 25, 40, 50, 100, 250, 500, 650, 1000], n_rows)
+    df = pd.DataFrame({
+        'brand_name': pd.Series(ingredient).str.slice(0, 6).str.title()
+                      + rng.choice(["cin", "mol", "zole", "pril", "vir", "ex", "al"], n_rows)
+                      + rng.choice(_BRAND_SUFFIXES, n_rows),
+        'manufacturer': _skewed_choice(rng, vocabularies['manufacturer'], n_rows),
+        'price_inr': np.round(np.expm1(rng.normal(4.3, 1.0, n_rows)).clip(1.0, 5000.0), 2),
+        'is_discontinued': rng.random(n_rows) < 0.03,
+        'dosage_form': _skewed_choice(rng, vocabularies['dosage_form'], n_rows, a=0.8),
+        'pack_size': rng.choice([1, 5, 10, 15, 20, 30, 60, 100, 200], n_rows).astype(float),
+        'pack_unit': _skewed_choice(rng, vocabularies['pack_unit'], n_rows, a=0.8),
+        'num_active_ingredients': rng.integers(1, 3, n_rows),
+        'primary_ingredient': ingredient,
+        'primary_strength_mg': strength,
+        'therapeutic_class': _skewed_choice(rng, vocabularies['therapeutic_class'], n_rows, a=0.8),
+    })
+    if with_strength_text:
+        df['primary_strength'] = pd.Series(strength).map('{:g}'.format) + " " + rng.choice(_STRENGTH_UNITS, n_rows)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic cleaned dataset.")
+    parser.add_argument("output")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiple of the real dataset size")
+    parser.add_argument("--model", default="xgb_price_predictor.joblib")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    vocabularies = vocabularies_from_model(joblib.load(args.model))
+    df = make_dataset(int(BASE_ROWS * args.scale), vocabularies, args.seed)
+    df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df):,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
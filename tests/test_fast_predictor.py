@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_predictor import CompiledPredictor
+from features import build_features, make_pipeline, uses_sparse_encoding
+from strength import PARSER_VERSION
+
+
+def _frame(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'manufacturer': rng.choice([f"maker {i}" for i in range(12)], n),
+        'dosage_form': rng.choice(["tablet", "capsule", "syrup", "injection", "cream"], n),
+        'pack_unit': rng.choice(["strip", "bottle", "vial", "tube"], n),
+        'primary_ingredient': rng.choice([f"ingredient {i}" for i in range(20)], n),
+        'therapeutic_class': rng.choice(["analgesic", "antibiotic", "antacid", "vitamin"], n),
+        'pack_size': rng.choice([1.0, 10.0, 15.0, 30.0, 100.0], n),
+        'num_active_ingredients': rng.integers(1, 4, n).astype(float),
+        'primary_strength': rng.choice(["5 mg", "250 mg", "1 g", "250 mg/5 ml", "2%", "500 mcg"], n),
+        'is_discontinued': rng.random(n) < 0.1,
+    })
+
+
+@pytest.fixture(scope="module", params=[True, False], ids=["csr", "dense"])
+def model(request):
+    frame = _frame(2_000, seed=0)
+    X = build_features(frame)
+    # prices that depend on every kind of feature, so the trees split on all of them
+    y = (np.log1p(X['primary_strength_mg'].fillna(1.0)) + 0.02 * X['pack_size']
+         + (X['dosage_form'] == "injection") * 1.5 + X['is_discontinued'] * 0.5
+         + np.random.default_rng(1).normal(0, 0.1, len(X)))
+    pipeline = make_pipeline(sparse=request.param, n_estimators=30, max_depth=5, n_jobs=1)
+    pipeline.fit(X, y)
+    pipeline.strength_parser = PARSER_VERSION
+    assert uses_sparse_encoding(pipeline) is request.param
+    return pipeline
+
+
+def test_batch_matches_pipeline(model):
+    X = build_features(_frame(500, seed=2))
+    compiled = CompiledPredictor.from_pipeline(model)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(X), atol=1e-4)
+    assert compiled.verify(model, X) <= 1e-4
+
+
+def test_rows_match_pipeline(model):
+    frame = _frame(200, seed=3)
+    X = build_features(frame)
+    compiled = CompiledPredictor.from_pipeline(model)
+    expected = model.predict(X)
+    rows = X.to_dict('records')
+    np.testing.assert_allclose(compiled.predict_rows(rows), expected, atol=1e-4)
+    np.testing.assert_allclose([compiled.predict_one(row) for row in rows], expected, atol=1e-4)
+
+
+def test_raw_rows_are_normalized_like_the_pipeline(model):
+    """Strength text, flag spellings and numeric strings are read as `build_features` reads them."""
+    frame = _frame(50, seed=4).astype({'is_discontinued': object, 'pack_size': object})
+    frame['is_discontinued'] = np.resize(["True", "false", 1, 0, True, None], len(frame))
+    frame['pack_size'] = frame['pack_size'].map(lambda value: f"{value:g}")
+    frame.loc[3, 'manufacturer'] = "unseen maker"
+    expected = model.predict(build_features(frame))
+    compiled = CompiledPredictor.from_pipeline(model)
+    rows = frame.to_dict('records')
+    np.testing.assert_allclose([compiled.predict_one(row) for row in rows], expected, atol=1e-4)
+    np.testing.assert_allclose(compiled.predict_rows(rows), expected, atol=1e-4)
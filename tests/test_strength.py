@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from strength import LEGACY_PARSER, PARSER_VERSION, parse_strength, parse_strength_value
+
+CASES = [
+    ("500 mg", 500.0),
+    ("500mg", 500.0),
+    ("500", 500.0),
+    ("250 mcg", 0.25),
+    ("250 µg", 0.25),
+    ("250ug", 0.25),
+    ("1 g", 1000.0),
+    ("1.5 gm", 1500.0),
+    ("0.5 kg", 500_000.0),
+    ("1%", 10.0),
+    ("0.05 %", 0.5),
+    ("250 mg/5 ml", 50.0),
+    ("2 mg/ml", 2.0),
+    ("10 mg/g", 10.0),
+    ("1 g/l", 1.0),
+    ("1,000 mg", 1000.0),
+    ("1,000,000 IU", np.nan),
+    ("1,500.5 mg", 1500.5),
+    ("5,10 mg", 5.0),  # a comma between numbers is not a thousands separator
+    ("100000 IU", np.nan),
+    ("40 units", np.nan),
+    ("5 ml", np.nan),
+    ("as directed", np.nan),
+    ("", np.nan),
+]
+
+LEGACY_CASES = ["500 mg", "250 mcg", "1 g", "1%", "250 mg/5 ml", "1,000 mg", "100000 IU", "0.5", "tablet", ""]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_parse_strength_value(text, expected):
+    np.testing.assert_allclose(parse_strength_value(text), expected, equal_nan=True)
+
+
+def test_vectorized_matches_single_value():
+    texts = [text for text, _ in CASES] + [None, np.nan, 250, 0.5]
+    for version in (LEGACY_PARSER, PARSER_VERSION):
+        column = parse_strength(pd.Series(texts * 3), version)
+        single = [parse_strength_value(text, version) for text in texts * 3]
+        np.testing.assert_allclose(column.to_numpy(), single, equal_nan=True)
+
+
+def test_parse_strength_keeps_index():
+    values = pd.Series(["1 g", None, "5 mg"], index=[10, 20, 30])
+    parsed = parse_strength(values)
+    assert parsed.name == 'primary_strength_mg'
+    assert list(parsed.index) == [10, 20, 30]
+    np.testing.assert_allclose(parsed.to_numpy(), [1000.0, np.nan, 5.0], equal_nan=True)
+
+
+def test_legacy_parser_takes_first_number():
+    expected = pd.Series(LEGACY_CASES).str.extract(r"(\d+\.?\d*)", expand=False).astype(float).to_numpy()
+    np.testing.assert_allclose(parse_strength(pd.Series(LEGACY_CASES), LEGACY_PARSER).to_numpy(),
+                               expected, equal_nan=True)
+    np.testing.assert_allclose([parse_strength_value(text, LEGACY_PARSER) for text in LEGACY_CASES],
+                               expected, equal_nan=True)
+
+
+def test_unknown_version():
+    with pytest.raises(ValueError):
+        parse_strength(pd.Series(["5 mg"]), 99)
+    with pytest.raises(ValueError):
+        parse_strength_value("5 mg", 99)
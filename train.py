@@ -0,0 +1,472 @@
+"""Out-of-core training of the price model from the raw Kaggle CSV.
+
+Reproduces the notebook recipe (drop rows without pack size/unit/strength,
+drop log-price IQR outliers, parse strength, fit one-hot + scaler + XGBoost
+on log1p(price)) without ever holding the dataset in memory:
+
+1. Stream the CSV once to build a fixed-resolution histogram of log prices,
+   from which the Q1/Q3 outlier bounds are read off.
+2. Stream it again, split rows 80/20 with a seeded generator, and accumulate
+   encoder vocabularies and scaler moments on the training rows.
+3. Stream it a third time through an XGBoost data iterator into a quantized
+   `QuantileDMatrix` (or an on-disk external-memory cache with
+   `--external-memory`), train, and evaluate on the held-out rows.
+
+Peak memory is one CSV chunk plus the vocabularies and the quantized training
+matrix; with `--external-memory` the matrix is paged from disk instead. The
+result is the same sklearn Pipeline the app loads, plus its pickle-free
+export (see `model_artifact.py`). The pipeline records the strength parser
+version it was trained with (`strength_parser`). `--update` keeps parsing new
+rows the way the model's original data was.
+
+Usage:
+    python train.py indian_pharmaceutical_products_clean.csv
+    python train.py raw.csv --output xgb_price_predictor.joblib --cleaned-output pharma_data_cleaned.csv
+    python train.py raw.csv --external-memory /tmp/xgb-cache
+    python train.py new_prices.csv --update xgb_price_predictor.joblib --n-estimators 20 --reference raw.csv
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from batch_predict import MODEL_PATH
+from data_store import DATA_PATH
+from features import (CATEGORICAL_FEATURES, NUMERIC_FEATURES, build_features, make_pipeline,
+                      make_preprocessor, model_strength_parser, uses_sparse_encoding)
+from model_artifact import artifact_path_for, export_artifact, remap_booster_features
+from strength import PARSER_VERSION, parse_strength
+
+DEFAULT_CHUNK_SIZE = 100_000
+# XGBRegressor settings an update must continue with, so appended trees match the existing ones
+TREE_PARAMS = ['max_depth', 'max_leaves', 'grow_policy', 'learning_rate', 'min_child_weight', 'gamma', 'subsample',
+               'colsample_bytree', 'colsample_bylevel', 'colsample_bynode', 'reg_lambda', 'reg_alpha', 'max_bin',
+               'tree_method', 'max_delta_step']
+DROPPED_COLUMNS = ['product_id', 'manufacturer_raw', 'packaging_raw', 'active_ingredients']
+REQUIRED_COLUMNS = ['pack_size', 'pack_unit', 'primary_strength']
+
+# log1p(price) histogram used for the streaming quantiles: 1e-4 resolution up to log1p(~5e8 INR).
+_LOG_PRICE_MAX = 20.0
+_HIST_BINS = 200_000
+
+
+class LogPriceHistogram:
+    """Fixed-bin histogram of log1p(price) with linear interpolation inside bins."""
+
+    def __init__(self, upper=_LOG_PRICE_MAX, bins=_HIST_BINS):
+        self.edges = np.linspace(0.0, upper, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values):
+        idx = np.searchsorted(self.edges, values, side='right') - 1
+        np.add.at(self.counts, np.clip(idx, 0, len(self.counts) - 1), 1)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        cumulative = np.cumsum(self.counts)
+        target = q * (cumulative[-1] - 1)
+        b = int(np.searchsorted(cumulative, target, side='right'))
+        before = cumulative[b - 1] if b else 0
+        fraction = (target - before + 1) / self.counts[b] if self.counts[b] else 0.0
+        width = self.edges[1] - self.edges[0]
+        return float(self.edges[b] + min(fraction, 1.0) * width)
+
+
+class RunningMoments:
+    """Per-column count/mean/M2 merged chunk by chunk (Chan et al.), ignoring NaNs."""
+
+    def __init__(self, n_columns):
+        self.n = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n_b = np.sum(~np.isnan(values), axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(n_b > 0, np.nansum(values, axis=0) / np.maximum(n_b, 1), 0.0)
+            m2_b = np.nansum((values - mean_b) ** 2, axis=0)
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        safe_n = np.maximum(n, 1)
+        self.mean = self.mean + delta * n_b / safe_n
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.n * n_b / safe_n
+        self.n = n
+
+    @property
+    def var(self):
+        return self.m2 / np.maximum(self.n, 1)
+
+
+def iter_clean_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, strength_parser=PARSER_VERSION):
+    """Yield the notebook's cleaned rows (strength parsed, helper columns dropped) chunk by chunk."""
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        required = [col for col in REQUIRED_COLUMNS if col in chunk.columns] or ['primary_strength_mg']
+        chunk = chunk.dropna(subset=required + ['price_inr'])
+        chunk = chunk.drop(columns=[col for col in DROPPED_COLUMNS if col in chunk.columns])
+        if 'primary_strength' in chunk.columns:
+            chunk['primary_strength_mg'] = parse_strength(chunk['primary_strength'], strength_parser).to_numpy()
+            chunk = chunk.drop(columns='primary_strength')
+        yield chunk.reset_index(drop=True)
+
+
+def iter_split_chunks(path, bounds, chunk_size=DEFAULT_CHUNK_SIZE, test_size=0.2, seed=42,
+                      strength_parser=PARSER_VERSION):
+    """Yield `(clean_chunk, is_test)` for rows inside the outlier bounds.
+
+    The split draws one uniform per kept row from a single seeded stream, so it
+    is identical on every pass and independent of `chunk_size`.
+    """
+    lower, upper = bounds
+    rng = np.random.default_rng(seed)
+    for chunk in iter_clean_chunks(path, chunk_size, strength_parser):
+        price_log = np.log1p(chunk['price_inr'].to_numpy(dtype=np.float64))
+        chunk = chunk[(price_log >= lower) & (price_log <= upper)].reset_index(drop=True)
+        yield chunk, rng.random(len(chunk)) < test_size
+
+
+def outlier_bounds(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Pass 1: the notebook's `Q1 - 1.5*IQR, Q3 + 1.5*IQR` bounds on log1p(price)."""
+    hist = LogPriceHistogram()
+    for chunk in iter_clean_chunks(path, chunk_size):
+        hist.update(np.log1p(chunk['price_inr'].to_numpy(dtype=np.float64)))
+    if not hist.total:
+        raise ValueError(f"No usable rows in {path}")
+    q1, q3 = hist.quantile(0.25), hist.quantile(0.75)
+    iqr = q3 - q1
+    return (q1 - 1.5 * iqr, q3 + 1.5 * iqr), hist.total
+
+
+def fit_statistics(path, bounds, chunk_size, test_size, seed, cleaned_output=None, strength_parser=PARSER_VERSION):
+    """Pass 2: vocabularies and scaler moments of the training rows.
+
+    Optionally also streams every kept row to `cleaned_output` (the app's dataset).
+    """
+    vocabularies = {col: set() for col in CATEGORICAL_FEATURES}
+    has_missing = {col: False for col in CATEGORICAL_FEATURES}
+    moments = RunningMoments(len(NUMERIC_FEATURES))
+    counts = {'train': 0, 'test': 0}
+    price_max = 0.0
+    for i, (chunk, is_test) in enumerate(iter_split_chunks(path, bounds, chunk_size, test_size, seed,
+                                                           strength_parser)):
+        if cleaned_output:
+            chunk.to_csv(cleaned_output, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        if len(chunk):
+            price_max = max(price_max, float(chunk['price_inr'].max()))
+        X = build_features(chunk[~is_test])
+        for col in CATEGORICAL_FEATURES:
+            values = X[col]
+            has_missing[col] |= bool(values.isna().any())
+            vocabularies[col].update(values.dropna().astype(str).unique())
+        moments.update(X[NUMERIC_FEATURES].to_numpy(dtype=np.float64))
+        counts['train'] += int((~is_test).sum())
+        counts['test'] += int(is_test.sum())
+    return vocabularies, has_missing, moments, counts, price_max
+
+
+def fitted_preprocessor(vocabularies, has_missing, mean, var, n_seen, sparse=True):
+    """A fitted ColumnTransformer equal to fitting `make_preprocessor` on the training rows.
+
+    The one-hot encoder is fitted on a stub frame holding each vocabulary value
+    once (its categories come out sorted, exactly as a full fit would give); the
+    scaler's statistics are then replaced with the given ones.
+    """
+    columns = {}
+    for col in CATEGORICAL_FEATURES:
+        values = sorted(vocabularies[col]) + ([np.nan] if has_missing[col] else [])
+        columns[col] = values or [""]
+    n_rows = max(len(values) for values in columns.values())
+    stub = pd.DataFrame({col: pd.Series(values + values[-1:] * (n_rows - len(values)), dtype=object)
+                         for col, values in columns.items()})
+    for col in NUMERIC_FEATURES:
+        stub[col] = 0.0
+
+    preprocessor = make_preprocessor(sparse).fit(stub)
+    scaler = preprocessor.named_transformers_['num']
+    n_seen = np.broadcast_to(np.asarray(n_seen, dtype=np.int64), (len(NUMERIC_FEATURES),))
+    scaler.mean_ = np.array(mean, dtype=np.float64)
+    scaler.var_ = np.array(var, dtype=np.float64)
+    scale = np.sqrt(scaler.var_)
+    scaler.scale_ = np.where(scale < 10 * np.finfo(scale.dtype).eps, 1.0, scale)
+    scaler.n_samples_seen_ = int(n_seen[0]) if (n_seen == n_seen[0]).all() else n_seen
+    return preprocessor
+
+
+def _price_iter_class():
+    import xgboost as xgb
+
+    class PriceDataIter(xgb.DataIter):
+        """Feeds the encoded training chunks to XGBoost, re-reading the CSV on every pass."""
+
+        def __init__(self, path, bounds, preprocessor, chunk_size, test_size, seed, cache_prefix=None,
+                     strength_parser=PARSER_VERSION):
+            self._args = (path, bounds, chunk_size, test_size, seed, strength_parser)
+            self._preprocessor = preprocessor
+            self._chunks = None
+            super().__init__(cache_prefix=cache_prefix)
+
+        def reset(self):
+            self._chunks = None
+
+        def next(self, input_data):
+            if self._chunks is None:
+                self._chunks = iter_split_chunks(*self._args)
+            for chunk, is_test in self._chunks:
+                train = chunk[~is_test]
+                if len(train):
+                    encoded = self._preprocessor.transform(build_features(train))
+                    input_data(data=encoded.astype(np.float32),
+                               label=np.log1p(train['price_inr'].to_numpy(dtype=np.float64)))
+                    return True
+            return False
+
+    return PriceDataIter
+
+
+def train_booster(data_iter, params, num_boost_round, external_memory=False, max_bin=256, xgb_model=None):
+    """Train on `data_iter`, continuing from `xgb_model` when given."""
+    import xgboost as xgb
+
+    if external_memory:
+        dmatrix_cls = getattr(xgb, 'ExtMemQuantileDMatrix', None)
+        dtrain = dmatrix_cls(data_iter, max_bin=max_bin) if dmatrix_cls else xgb.DMatrix(data_iter)
+    else:
+        dtrain = xgb.QuantileDMatrix(data_iter, max_bin=max_bin)
+    return xgb.train(params, dtrain, num_boost_round=num_boost_round, xgb_model=xgb_model)
+
+
+def evaluate(model, path, bounds, chunk_size, test_size, seed, price_max):
+    """Streamed MAE/RMSE/R² on the held-out rows (strength parsed as `model` expects), with the notebook's clipping."""
+    n = sse = sae = sum_y = sum_y2 = 0.0
+    for chunk, is_test in iter_split_chunks(path, bounds, chunk_size, test_size, seed, model_strength_parser(model)):
+        test = chunk[is_test]
+        if not len(test):
+            continue
+        y = test['price_inr'].to_numpy(dtype=np.float64)
+        pred = np.clip(np.expm1(model.predict(build_features(test))), 0, price_max)
+        n += len(y)
+        sse += float(np.sum((y - pred) ** 2))
+        sae += float(np.sum(np.abs(y - pred)))
+        sum_y += float(y.sum())
+        sum_y2 += float(np.sum(y ** 2))
+    if not n:
+        return {}
+    sst = sum_y2 - sum_y ** 2 / n
+    return {'mae': sae / n, 'rmse': (sse / n) ** 0.5, 'r2': 1 - sse / sst if sst > 0 else float('nan')}
+
+
+def save_pipeline(pipeline, output):
+    """Replace `output` atomically, then re-export its artifact.
+
+    The joblib file goes first: a `model_watcher` that sees it before the new
+    artifact re-exports from it, so it never swaps back to the old model.
+    """
+    tmp = f"{output}.tmp-{os.getpid()}"
+    try:
+        joblib.dump(pipeline, tmp)
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    export_artifact(pipeline, artifact_path_for(output), source_path=output)
+
+
+def train(path, output=MODEL_PATH, chunk_size=DEFAULT_CHUNK_SIZE, test_size=0.2, seed=42,
+          sparse=True, external_memory=None, cleaned_output=None, **xgb_params):
+    """Run the three passes and save the pipeline to `output`. Returns a summary dict."""
+    import xgboost as xgb
+
+    t0 = time.perf_counter()
+    bounds, n_clean = outlier_bounds(path, chunk_size)
+    print(f"Pass 1: {n_clean:,} rows, log-price bounds [{bounds[0]:.4f}, {bounds[1]:.4f}]")
+
+    vocabularies, has_missing, moments, counts, price_max = fit_statistics(
+        path, bounds, chunk_size, test_size, seed, cleaned_output)
+    preprocessor = fitted_preprocessor(vocabularies, has_missing, moments.mean, moments.var, moments.n, sparse)
+    print(f"Pass 2: {counts['train']:,} train / {counts['test']:,} test rows, "
+          + ", ".join(f"{col} {len(v):,}" for col, v in vocabularies.items()))
+
+    pipeline = make_pipeline(sparse, **xgb_params)
+    regressor = pipeline.named_steps['regressor']
+    # The same parameters `XGBRegressor.fit` would hand to `xgb.train`.
+    params = regressor.get_xgb_params()
+    n_rounds = regressor.get_params()['n_estimators']
+    max_bin = regressor.get_params()['max_bin'] or 256
+
+    with tempfile.TemporaryDirectory(dir=external_memory) as cache_dir:
+        cache_prefix = os.path.join(cache_dir, "train") if external_memory else None
+        data_iter = _price_iter_class()(path, bounds, preprocessor, chunk_size, test_size, seed, cache_prefix)
+        booster = train_booster(data_iter, params, n_rounds, bool(external_memory), max_bin)
+    print(f"Pass 3: trained {booster.num_boosted_rounds()} rounds")
+
+    regressor.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+    pipeline.steps[0] = ('preprocessing', preprocessor)
+    pipeline.strength_parser = PARSER_VERSION
+    save_pipeline(pipeline, output)
+
+    scores = evaluate(pipeline, path, bounds, chunk_size, test_size, seed, price_max)
+    summary = {'rows': counts, 'bounds': bounds, 'seconds': time.perf_counter() - t0,
+               'xgboost': xgb.__version__, **scores}
+    if scores:
+        print(f"MAE  : {scores['mae']:.2f}\nRMSE : {scores['rmse']:.2f}\nR²   : {scores['r2']:.3f}")
+    print(f"Saved {output} in {summary['seconds']:.1f}s")
+    return summary
+
+
+def tree_params(regressor):
+    """The `TREE_PARAMS` a fitted XGBRegressor was built with (unset ones are XGBoost's defaults).
+
+    Read from the estimator, not `booster.save_config()`: a booster loaded from
+    a raw model (as `train` does) or from an older pickle reports the defaults
+    there, e.g. eta 0.3 for a model trained at 0.1.
+    """
+    return {name: getattr(regressor, name) for name in TREE_PARAMS if getattr(regressor, name, None) is not None}
+
+
+def _max_price(path, bounds, chunk_size, test_size, seed):
+    return max((float(chunk['price_inr'].max()) for chunk, _ in iter_split_chunks(path, bounds, chunk_size, test_size,
+                                                                                   seed) if len(chunk)), default=0.0)
+
+
+def update(model_path, path, output=None, n_rounds=20, chunk_size=DEFAULT_CHUNK_SIZE, test_size=0.2, seed=42,
+           external_memory=None, max_regression=0.0, reference=None, **xgb_params):
+    """Add `n_rounds` boosting rounds on new rows in `path` to the pipeline saved at `model_path`.
+
+    New manufacturers, ingredients, etc. found in the new rows are added to the
+    encoder vocabularies. The existing trees are rewritten onto the widened
+    one-hot layout, and the scaler is kept as is. The new trees are grown with
+    the old model's settings (`tree_params`); `xgb_params` override them.
+    Strength text is parsed with the old model's parser version, which the update keeps.
+
+    Both models are scored on the new rows' held-out split and, with
+    `reference` (the data the model was trained on; the raw CSV with the same
+    `seed`/`test_size` gives exactly its original held-out rows), on that
+    file's held-out split too. The update is saved (to `output`, default
+    `model_path`) only if neither RMSE is more than `1 + max_regression`
+    times the old model's. Returns a summary dict with `accepted`.
+    """
+    t0 = time.perf_counter()
+    output = output or model_path
+    old = joblib.load(model_path)
+    old_pre = old.named_steps['preprocessing']
+    encoder = old_pre.named_transformers_['cat']
+    scaler = old_pre.named_transformers_['num']
+    sparse = uses_sparse_encoding(old)
+    strength_parser = model_strength_parser(old)
+
+    bounds, n_clean = outlier_bounds(path, chunk_size)
+    vocabularies, has_missing, _, counts, price_max = fit_statistics(path, bounds, chunk_size, test_size, seed,
+                                                                     strength_parser=strength_parser)
+    added = {}
+    for col, categories in zip(CATEGORICAL_FEATURES, encoder.categories_):
+        known = {value for value in categories if not pd.isnull(value)}
+        added[col] = len(vocabularies[col] - known)
+        vocabularies[col] |= known
+        has_missing[col] |= len(known) < len(categories)
+    preprocessor = fitted_preprocessor(vocabularies, has_missing, scaler.mean_, scaler.var_,
+                                       scaler.n_samples_seen_, sparse)
+    print(f"New data: {counts['train']:,} train / {counts['test']:,} test rows; new categories: "
+          + ", ".join(f"{col} +{n}" for col, n in added.items()))
+
+    # old encoded column -> new encoded column
+    new_categories = preprocessor.named_transformers_['cat'].categories_
+    column_map, offset = [], 0
+    for old_cats, new_cats in zip(encoder.categories_, new_categories):
+        position = {(None if pd.isnull(value) else value): i for i, value in enumerate(new_cats)}
+        column_map.extend(offset + position[None if pd.isnull(value) else value] for value in old_cats)
+        offset += len(new_cats)
+    column_map.extend(offset + j for j in range(len(NUMERIC_FEATURES)))
+    n_features = offset + len(NUMERIC_FEATURES)
+    booster = remap_booster_features(old.named_steps['regressor'].get_booster(), np.asarray(column_map), n_features)
+
+    settings = {**tree_params(old.named_steps['regressor']), **xgb_params}
+    print("Tree settings: " + ", ".join(f"{name}={value}" for name, value in settings.items()))
+    pipeline = make_pipeline(sparse, **settings)
+    regressor = pipeline.named_steps['regressor']
+    params = regressor.get_xgb_params()
+    max_bin = regressor.get_params()['max_bin'] or 256
+    with tempfile.TemporaryDirectory(dir=external_memory) as cache_dir:
+        cache_prefix = os.path.join(cache_dir, "update") if external_memory else None
+        data_iter = _price_iter_class()(path, bounds, preprocessor, chunk_size, test_size, seed, cache_prefix,
+                                        strength_parser)
+        booster = train_booster(data_iter, params, n_rounds, bool(external_memory), max_bin, xgb_model=booster)
+    regressor.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+    pipeline.steps[0] = ('preprocessing', preprocessor)
+    pipeline.strength_parser = strength_parser
+
+    def no_worse(before, after):
+        return bool(after) and (not before or after['rmse'] <= before['rmse'] * (1 + max_regression))
+
+    before = evaluate(old, path, bounds, chunk_size, test_size, seed, price_max)
+    after = evaluate(pipeline, path, bounds, chunk_size, test_size, seed, price_max)
+    accepted = no_worse(before, after)
+    print(f"Held-out RMSE on new rows: {before.get('rmse', float('nan')):.2f} -> {after.get('rmse', float('nan')):.2f}")
+    summary = {'rows': counts, 'added_categories': added, 'params': settings, 'before': before, 'after': after}
+    if reference is not None:
+        ref_bounds, _ = outlier_bounds(reference, chunk_size)
+        ref_max = _max_price(reference, ref_bounds, chunk_size, test_size, seed)
+        summary['reference_before'] = evaluate(old, reference, ref_bounds, chunk_size, test_size, seed, ref_max)
+        summary['reference_after'] = evaluate(pipeline, reference, ref_bounds, chunk_size, test_size, seed, ref_max)
+        accepted = accepted and no_worse(summary['reference_before'], summary['reference_after'])
+        print(f"Held-out RMSE on {reference}: {summary['reference_before'].get('rmse', float('nan')):.2f} -> "
+              f"{summary['reference_after'].get('rmse', float('nan')):.2f}")
+    if accepted:
+        save_pipeline(pipeline, output)
+        print(f"Saved {output} with {booster.num_boosted_rounds()} rounds in {time.perf_counter() - t0:.1f}s")
+    else:
+        print("Update rejected: held-out RMSE got worse; model left unchanged")
+    return {'accepted': accepted, **summary}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the price model from the raw CSV in chunks.")
+    parser.add_argument("input", help="Raw product CSV (indian_pharmaceutical_products_clean.csv)")
+    parser.add_argument("--output", default=None, help=f"Model to write (default {MODEL_PATH}, or the --update model)")
+    parser.add_argument("--update", metavar="MODEL", default=None,
+                        help="Add --n-estimators rounds to MODEL using the input rows instead of training from scratch")
+    parser.add_argument("--max-regression", type=float, default=0.0,
+                        help="With --update: allowed relative increase of held-out RMSE before the update is rejected")
+    parser.add_argument("--reference", default=None,
+                        help="Required with --update: the raw CSV the model was trained on; with the same "
+                             "--seed/--test-size its original held-out rows must not get worse either")
+    parser.add_argument("--cleaned-output", default=None,
+                        help=f"Also write the cleaned rows for the app (e.g. {DATA_PATH})")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dense", action="store_true", help="Train on the dense one-hot encoding")
+    parser.add_argument("--external-memory", metavar="DIR", default=None,
+                        help="Page the training matrix through an on-disk cache in DIR")
+    parser.add_argument("--n-estimators", type=int, default=None, help="Boosting rounds (default 100, 20 with --update)")
+    parser.add_argument("--max-depth", type=int, default=None, help="Default 6, or the --update model's")
+    parser.add_argument("--learning-rate", type=float, default=None, help="Default 0.1, or the --update model's")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"input file not found: {args.input}")
+    xgb_params = {name: value for name, value in (('max_depth', args.max_depth), ('learning_rate', args.learning_rate))
+                  if value is not None}
+    if args.update:
+        if args.reference is None:
+            parser.error("--update requires --reference, the raw CSV the model was trained on")
+        if not os.path.exists(args.reference):
+            parser.error(f"reference data not found: {args.reference} (--update checks the old data too)")
+        summary = update(args.update, args.input, args.output, args.n_estimators or 20, args.chunk_size,
+                         args.test_size, args.seed, args.external_memory, args.max_regression, args.reference,
+                         **xgb_params)
+        sys.exit(0 if summary['accepted'] else 1)
+    train(args.input, args.output or MODEL_PATH, args.chunk_size, args.test_size, args.seed,
+          sparse=not args.dense, external_memory=args.external_memory, cleaned_output=args.cleaned_output,
+          n_estimators=args.n_estimators or 100, **xgb_params)
+
+
+if __name__ == "__main__":
+    main()
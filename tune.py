@@ -0,0 +1,260 @@
+"""Parallel hyperparameter search with cross-validation and successive halving.
+
+The features are encoded once. The encoded matrix (CSR arrays, or the dense
+array with `--dense`) and the log-price target are written as `.npy` files
+and memory-mapped read-only by every worker of a process pool. Jobs carry
+only parameters and a fold number, never the data. Each worker keeps the
+matrices of one fold only, the one it is scoring. Jobs are queued fold by fold,
+so a worker rebuilds them about once per fold per rung. Its private memory stays
+at one fold's training matrix, however many folds and workers there are.
+
+Candidates are sampled from `PARAM_GRID` (the notebook's configuration is
+always included). They race through successive-halving rungs: every rung
+trains all survivors for a round budget with early stopping on each
+validation fold, keeps the best `1/eta` by mean CV RMSE (log price) and
+multiplies the budget by `eta`. The winner can be refit on all rows and saved
+as the app's artifact. A cleaned CSV does not say how its `primary_strength_mg`
+was parsed, so `--strength-parser` names it for the saved model. The default,
+1, is the shipped `pharma_data_cleaned.csv`'s first-number parse. Pass 2 for
+a file written by `train.py --cleaned-output` or the current notebook.
+
+Usage:
+    python tune.py --data pharma_data_cleaned.csv --workers 4
+    python tune.py --n-candidates 27 --folds 5 --output xgb_price_predictor.joblib
+    python tune.py --scaling          # time the same search with 1, 2, 4, ... workers
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from batch_predict import MODEL_PATH
+from data_store import DATA_PATH, load_dataset
+from features import build_features, make_pipeline, make_preprocessor
+from strength import LEGACY_PARSER, PARSER_VERSION
+from train import save_pipeline
+
+PARAM_GRID = {
+    'max_depth': [4, 6, 8, 10],
+    'learning_rate': [0.03, 0.1, 0.3],
+    'min_child_weight': [1, 5],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.5, 0.8, 1.0],
+    'reg_lambda': [1.0, 10.0],
+}
+BASELINE = {'max_depth': 6, 'learning_rate': 0.1, 'min_child_weight': 1,
+            'subsample': 1.0, 'colsample_bytree': 1.0, 'reg_lambda': 1.0}
+
+_worker = {}
+
+
+def share_matrix(X, y, directory):
+    """Write the encoded matrix and target as `.npy` files; returns the paths workers attach to."""
+    if sp.issparse(X):
+        X = sp.csr_matrix(X, dtype=np.float32)
+        arrays = {'data': X.data, 'indices': X.indices, 'indptr': X.indptr}
+        shape = X.shape
+    else:
+        arrays = {'dense': np.ascontiguousarray(X, dtype=np.float32)}
+        shape = arrays['dense'].shape
+    arrays['y'] = np.asarray(y, dtype=np.float32)
+    paths = {'shape': shape}
+    for name, array in arrays.items():
+        paths[name] = os.path.join(directory, f"{name}.npy")
+        np.save(paths[name], array)
+    return paths
+
+
+def attach_matrix(paths):
+    """Memory-map the shared arrays read-only; returns `(X, y)` without copying them."""
+    y = np.load(paths['y'], mmap_mode='r')
+    if 'dense' in paths:
+        return np.load(paths['dense'], mmap_mode='r'), y
+    X = sp.csr_matrix((np.load(paths['data'], mmap_mode='r'),
+                       np.load(paths['indices'], mmap_mode='r'),
+                       np.load(paths['indptr'], mmap_mode='r')), shape=paths['shape'], copy=False)
+    return X, y
+
+
+def fold_indices(n_rows, n_folds, seed):
+    """Shuffled K-fold `(train, valid)` positions, identical in every process."""
+    order = np.random.default_rng(seed).permutation(n_rows)
+    folds = np.array_split(order, n_folds)
+    return [(np.sort(np.concatenate(folds[:k] + folds[k + 1:])), np.sort(folds[k])) for k in range(n_folds)]
+
+
+def _init_worker(paths, n_folds, seed, nthread):
+    _worker.update(paths=paths, n_folds=n_folds, seed=seed, nthread=nthread, fold=None, dmatrices=None)
+
+
+def _fold_dmatrices(fold):
+    """`(dtrain, dvalid, valid prices)` of `fold`; only the last fold used is kept."""
+    import xgboost as xgb
+
+    if _worker['fold'] != fold:
+        _worker['fold'] = _worker['dmatrices'] = None  # free the old fold before building the next
+        X, y = attach_matrix(_worker['paths'])
+        train_idx, valid_idx = fold_indices(X.shape[0], _worker['n_folds'], _worker['seed'])[fold]
+        # Plain DMatrix: a QuantileDMatrix built straight from a wide CSR slice trains ~100x slower here.
+        # The row slices are temporary copies, released once XGBoost has taken its own.
+        dtrain = xgb.DMatrix(X[train_idx], label=y[train_idx])
+        dvalid = xgb.DMatrix(X[valid_idx], label=y[valid_idx])
+        _worker['dmatrices'] = (dtrain, dvalid, np.expm1(np.asarray(y[valid_idx], dtype=np.float64)))
+        _worker['fold'] = fold
+    return _worker['dmatrices']
+
+
+def score_candidate(params, fold, num_rounds, early_stopping_rounds):
+    """Train one candidate on one fold; runs inside a pool worker."""
+    import xgboost as xgb
+
+    dtrain, dvalid, price = _fold_dmatrices(fold)
+    t0 = time.perf_counter()
+    booster = xgb.train(
+        {'objective': 'reg:squarederror', 'tree_method': 'hist', 'nthread': _worker['nthread'],
+         'seed': _worker['seed'], **params},
+        dtrain, num_boost_round=num_rounds, evals=[(dvalid, 'valid')],
+        early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+    best = booster.best_iteration
+    pred = np.expm1(booster.predict(dvalid, iteration_range=(0, best + 1)))
+    r2 = 1 - np.sum((price - pred) ** 2) / np.sum((price - price.mean()) ** 2)
+    return {'rmse_log': float(booster.best_score), 'r2': float(r2), 'best_iteration': int(best),
+            'seconds': time.perf_counter() - t0}
+
+
+def sample_candidates(n_candidates, seed):
+    grid = [dict(zip(PARAM_GRID, values)) for values in itertools.product(*PARAM_GRID.values())]
+    rng = np.random.default_rng(seed)
+    picks = [grid[i] for i in rng.permutation(len(grid))[:max(0, n_candidates - 1)]]
+    return [BASELINE] + [p for p in picks if p != BASELINE]
+
+
+def successive_halving(paths, candidates, n_folds=5, workers=None, min_rounds=30, max_rounds=1000,
+                       eta=3, early_stopping_rounds=20, seed=42, nthread=1, log=print):
+    """Race `candidates` through halving rungs on a process pool.
+
+    Returns the final rung's results (best first) and every rung's results.
+    """
+    workers = workers or os.cpu_count()
+    survivors = list(enumerate(candidates))
+    rounds = min_rounds
+    history = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(paths, n_folds, seed, nthread)) as pool:
+        while True:
+            t0 = time.perf_counter()
+            # fold-major, so consecutive jobs on a worker mostly reuse its fold matrices
+            jobs = {(cid, fold): pool.submit(score_candidate, params, fold, rounds, early_stopping_rounds)
+                    for fold in range(n_folds) for cid, params in survivors}
+            results = []
+            for cid, params in survivors:
+                folds = [jobs[cid, fold].result() for fold in range(n_folds)]
+                results.append({
+                    'candidate': cid, 'rounds': rounds, **params,
+                    'rmse_log': float(np.mean([f['rmse_log'] for f in folds])),
+                    'rmse_log_std': float(np.std([f['rmse_log'] for f in folds])),
+                    'r2': float(np.mean([f['r2'] for f in folds])),
+                    'n_estimators': int(np.mean([f['best_iteration'] for f in folds])) + 1,
+                })
+            results.sort(key=lambda r: r['rmse_log'])
+            history.extend(results)
+            log(f"rung {rounds:>5} rounds: {len(survivors):>3} candidates x {n_folds} folds "
+                f"in {time.perf_counter() - t0:.1f}s, best rmse_log {results[0]['rmse_log']:.4f} "
+                f"(R² {results[0]['r2']:.3f})")
+            if rounds >= max_rounds:
+                return results, history
+            keep = {r['candidate'] for r in results[:max(1, len(results) // eta)]}
+            survivors = [(cid, params) for cid, params in survivors if cid in keep]
+            # A lone survivor gets the full budget; early stopping decides its final size.
+            rounds = max_rounds if len(survivors) == 1 else min(max_rounds, rounds * eta)
+
+
+def encode(data_path, sparse=True, strength_parser=LEGACY_PARSER):
+    df = load_dataset(data_path)
+    X = build_features(df, strength_parser)
+    y = np.log1p(df['price_inr'].to_numpy(dtype=np.float64))
+    return X, y, make_preprocessor(sparse).fit_transform(X)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the XGBoost price model with parallel CV.")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads-per-job", type=int, default=1)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-candidates", type=int, default=27)
+    parser.add_argument("--min-rounds", type=int, default=30)
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--eta", type=int, default=3, help="Halving factor between rungs")
+    parser.add_argument("--early-stopping-rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dense", action="store_true", help="Tune on the dense one-hot encoding")
+    parser.add_argument("--output", default=None,
+                        help=f"Refit the best configuration on all rows and save it (e.g. {MODEL_PATH})")
+    parser.add_argument("--strength-parser", type=int, choices=[LEGACY_PARSER, PARSER_VERSION], default=LEGACY_PARSER,
+                        help="Parser version behind the data's primary_strength_mg (see strength.py)")
+    parser.add_argument("--report", default=None, help="Write all rung results to this JSON file")
+    parser.add_argument("--scaling", action="store_true",
+                        help="Repeat the search with 1, 2, 4, ... workers and report wall-clock speed-up")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    X, y, encoded = encode(args.data, sparse=not args.dense, strength_parser=args.strength_parser)
+    print(f"Encoded {encoded.shape[0]:,} x {encoded.shape[1]:,} once in {time.perf_counter() - t0:.1f}s")
+    candidates = sample_candidates(args.n_candidates, args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="tune-") as shared_dir:
+        paths = share_matrix(encoded, y, shared_dir)
+        del encoded
+        search = dict(n_folds=args.folds, min_rounds=args.min_rounds, max_rounds=args.max_rounds, eta=args.eta,
+                      early_stopping_rounds=args.early_stopping_rounds, seed=args.seed,
+                      nthread=args.threads_per_job)
+
+        if args.scaling:
+            counts = sorted({1, *[2 ** i for i in range(1, 16) if 2 ** i < args.workers], args.workers})
+            timings = []
+            for workers in counts:
+                t0 = time.perf_counter()
+                successive_halving(paths, candidates, workers=workers, log=lambda *_: None, **search)
+                timings.append({'workers': workers, 'seconds': time.perf_counter() - t0})
+            scaling = pd.DataFrame(timings)
+            scaling['speedup'] = scaling['seconds'].iloc[0] / scaling['seconds']
+            scaling['efficiency'] = scaling['speedup'] / scaling['workers']
+            print(f"\nScaling on {os.cpu_count()} cores:")
+            print(scaling.to_string(index=False, float_format='{:,.2f}'.format))
+            return
+
+        t0 = time.perf_counter()
+        results, history = successive_halving(paths, candidates, workers=args.workers, **search)
+        print(f"Search finished in {time.perf_counter() - t0:.1f}s with {args.workers} workers")
+
+    best = results[0]
+    params = {name: best[name] for name in PARAM_GRID}
+    print(f"Best: {json.dumps(params)} n_estimators={best['n_estimators']} "
+          f"CV rmse_log {best['rmse_log']:.4f} ± {best['rmse_log_std']:.4f}, R² {best['r2']:.3f}")
+    baseline = [r for r in history if r['candidate'] == 0]
+    if baseline:
+        print(f"Notebook configuration: CV rmse_log {baseline[-1]['rmse_log']:.4f}, R² {baseline[-1]['r2']:.3f} "
+              f"at {baseline[-1]['rounds']} rounds")
+
+    if args.report:
+        with open(args.report, "w") as fh:
+            json.dump({'best': best, 'history': history}, fh, indent=2)
+    if args.output:
+        pipeline = make_pipeline(sparse=not args.dense, n_estimators=best['n_estimators'],
+                                 random_state=args.seed, **params)
+        pipeline.fit(X, y)
+        pipeline.strength_parser = args.strength_parser
+        save_pipeline(pipeline, args.output)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""What-if price curves over pack size and strength.
+
+One product's features are held fixed while one or two numeric features are
+swept over a grid. The grid is built with NumPy: the fixed values are
+broadcast, the swept ones come from `np.meshgrid`. It is then scored as a
+single batch, so a 200-point curve costs about as much as one prediction
+rather than 200 form submits.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from batch_predict import predict_prices
+from features import FEATURES
+
+SWEEP_FEATURES = {
+    'pack_size': "Pack Size",
+    'primary_strength_mg': "Primary Strength (mg)",
+}
+DEFAULT_POINTS = 200
+MAX_HEATMAP_POINTS = 100  # per axis: at most 10,000 rows for a two-feature sweep
+
+
+def default_ranges(frame, low=0.01, high=0.99):
+    """`{feature: (low, high)}` between the given quantiles of the dataset."""
+    ranges = {}
+    for feature in SWEEP_FEATURES:
+        values = frame[feature].dropna().to_numpy(dtype=np.float64)
+        values = values[values > 0]
+        lo, hi = np.quantile(values, [low, high]) if len(values) else (1.0, 100.0)
+        ranges[feature] = (float(lo), float(max(hi, lo * 2)))
+    return ranges
+
+
+def sweep_values(low, high, points=DEFAULT_POINTS, log=True):
+    """`points` values from `low` to `high`, evenly spaced on a log or linear scale."""
+    if log and low > 0:
+        return np.geomspace(low, high, points)
+    return np.linspace(low, high, points)
+
+
+def build_grid(base_row, axes):
+    """Feature frame with one row per grid point: `base_row` with the `axes` features replaced.
+
+    `axes` maps one or two feature names to their values; rows run over the
+    last axis fastest (C order), matching `prices.reshape`.
+    """
+    mesh = np.meshgrid(*axes.values(), indexing='ij')
+    n = mesh[0].size
+    columns = {name: value for name, value in base_row.items() if name not in axes}
+    columns.update({name: grid.ravel() for name, grid in zip(axes, mesh)})
+    return pd.DataFrame(columns, index=pd.RangeIndex(n))[FEATURES]
+
+
+def price_grid(model, base_row, axes, compiled=None):
+    """Predicted prices (INR) on the grid, shaped `(len(values) for values in axes.values())`.
+
+    Scored in one call: the compiled evaluator when given, else `model`.
+    Returns `(prices, seconds)`.
+    """
+    t0 = time.perf_counter()
+    X = build_grid(base_row, axes)
+    if compiled is not None:
+        with metrics.timer('predict', engine='compiled'):
+            prices = np.expm1(compiled.predict(X))
+        metrics.inc('pharma_predictions_total', len(X), engine='compiled')
+    else:
+        prices = predict_prices(model, X)
+    shape = tuple(len(values) for values in axes.values())
+    return np.asarray(prices, dtype=np.float64).reshape(shape), time.perf_counter() - t0